@@ -1,10 +1,18 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, session, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, session, send_from_directory, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func, case, extract, text
-from datetime import datetime
+from sqlalchemy import func, case, extract, text, and_, or_, event, insert, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from datetime import datetime, date as date_type
 import os
+import json
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.security import generate_password_hash, check_password_hash
+from holdings_engine import Ledger, HOLDING_FIELDS, compute_holdings
+from forecast_engine import DAILY as FORECAST_DAILY, MONTHLY as FORECAST_MONTHLY, MAX_FORECAST_MONTHS, forecast
+from mortgage_engine import (LoanState, MAX_SCENARIOS, PAYMENT_TOTAL, Scenario, apply_events, build_schedule,
+                             opening_state, simulate_scenarios)
 
 app = Flask(__name__)
 
@@ -16,9 +24,13 @@ os.makedirs(instance_path, exist_ok=True)
 
 # Point to instance/finance.db (where the actual data is stored)
 db_path = os.path.join(instance_path, 'finance.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///' + db_path)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = 'finance_tracker_secret_key_2024'
+# Log the number of SQL statements each request issued (always on in debug mode)
+app.config['SQL_STATEMENT_COUNTER'] = os.environ.get('SQL_STATEMENT_COUNTER') == '1'
+# Mortgage interest: 'daily' (actual/365 daily rest) or 'monthly' (30/360 monthly rest)
+app.config['MORTGAGE_ACCRUAL'] = os.environ.get('MORTGAGE_ACCRUAL', 'daily')
 
 @app.template_filter('comma')
 def comma_filter(value):
@@ -31,6 +43,20 @@ def comma_filter(value):
 
 db = SQLAlchemy(app)
 
+# --- SQL statement counter (debug) ---
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_sql_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.sql_statement_count = g.get('sql_statement_count', 0) + 1
+
+@app.after_request
+def report_sql_statements(response):
+    if app.debug or app.config['SQL_STATEMENT_COUNTER']:
+        count = g.get('sql_statement_count', 0)
+        response.headers['X-SQL-Statements'] = str(count)
+        app.logger.info(f"SQL: {request.method} {request.path} ({request.endpoint}) issued {count} statements")
+    return response
+
 # User Model for multi-user support
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -156,6 +182,11 @@ class Transaction(db.Model):
     def __repr__(self):
         return f'<Transaction {self.id} - {self.description}>'
 
+    __table_args__ = (
+        db.Index('ix_transaction_user_date', 'user_id', 'date'),
+        db.Index('ix_transaction_user_account', 'user_id', 'account_id'),
+    )
+
 class BalanceHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     item_id = db.Column(db.Integer, db.ForeignKey('balance_item.id'), nullable=False)
@@ -171,6 +202,10 @@ class BalanceHistory(db.Model):
     def __repr__(self):
         return f'<BalanceHistory {self.id} - Item {self.item_id}>'
 
+    __table_args__ = (
+        db.Index('ix_balance_history_item_date', 'item_id', 'date'),
+    )
+
 class Investment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
@@ -189,6 +224,41 @@ class Investment(db.Model):
     def __repr__(self):
         return f'<Investment {self.symbol} - {self.type}>'
 
+    __table_args__ = (
+        db.Index('ix_investment_user_symbol_brokerage', 'user_id', 'symbol', 'brokerage'),
+        db.Index('ix_investment_user_date', 'user_id', 'date'),
+    )
+
+# Materialized holdings per (user, symbol, brokerage), maintained as investments change
+class Position(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    symbol = db.Column(db.String(20), nullable=False)
+    brokerage = db.Column(db.String(100), nullable=False, default='') # '' when the trade has no brokerage
+    market = db.Column(db.String(20), nullable=False)
+    currency = db.Column(db.String(10), nullable=False)
+    quantity = db.Column(db.Float, nullable=False, default=0.0)
+    cost_basis = db.Column(db.Float, nullable=False, default=0.0) # Average-cost basis of open quantity
+    total_dividends = db.Column(db.Float, nullable=False, default=0.0)
+    realized_pnl = db.Column(db.Float, nullable=False, default=0.0)
+    total_bought = db.Column(db.Float, nullable=False, default=0.0) # Includes Bonus/Split units
+    total_sold = db.Column(db.Float, nullable=False, default=0.0)
+    buy_cost = db.Column(db.Float, nullable=False, default=0.0)
+    sell_proceeds = db.Column(db.Float, nullable=False, default=0.0)
+    first_buy_date = db.Column(db.Date, nullable=True)
+    last_sell_date = db.Column(db.Date, nullable=True)
+    # Last trade replayed into this row; later trades can be applied incrementally
+    last_trade_date = db.Column(db.Date, nullable=True)
+    last_trade_id = db.Column(db.Integer, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'symbol', 'brokerage', name='uq_position_user_symbol_brokerage'),
+    )
+
+    def __repr__(self):
+        return f'<Position {self.symbol} @ {self.brokerage or "-"}: {self.quantity}>'
+
 class ForexTransaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
@@ -200,6 +270,10 @@ class ForexTransaction(db.Model):
     def __repr__(self):
         return f'<Forex {self.amount_myr} MYR @ {self.rate}>'
 
+    __table_args__ = (
+        db.Index('ix_forex_transaction_user_date', 'user_id', 'date'),
+    )
+
 class StockPrice(db.Model):
     symbol = db.Column(db.String(20), primary_key=True)
     price = db.Column(db.Float, nullable=False)
@@ -233,6 +307,10 @@ class BalanceItem(db.Model):
     # User ownership
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
 
+    __table_args__ = (
+        db.Index('ix_balance_item_user_classification', 'user_id', 'classification'),
+    )
+
 
 class Mortgage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -245,6 +323,10 @@ class Mortgage(db.Model):
     mrta_rate = db.Column(db.Float)
     events = db.relationship('MortgageEvent', backref='mortgage', lazy=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # User ownership
+    # Principal outstanding, valid until the next event date (None: no later events).
+    # Cleared by refresh_mortgage_ledger whenever an event is recorded.
+    cached_balance = db.Column(db.Float)
+    cached_balance_until = db.Column(db.Date)
 
 class MortgageEvent(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -253,8 +335,31 @@ class MortgageEvent(db.Model):
     type = db.Column(db.String(20), nullable=False) # 'PAYMENT', 'RATE_CHANGE'
     value = db.Column(db.Float, nullable=False)
     balance_after = db.Column(db.Float)
+    interest_paid = db.Column(db.Float) # PAYMENT split from the accrual replay (see refresh_mortgage_ledger)
+    principal_paid = db.Column(db.Float)
+    # PAYMENT only: 'TOTAL' instalment split by the replay, or 'PRINCIPAL' for entries made
+    # before interest accrual (principal-only value, user balance_after kept as a known balance)
+    payment_kind = db.Column(db.String(20))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # User ownership
 
+    __table_args__ = (
+        db.Index('ix_mortgage_event_mortgage_date', 'mortgage_id', 'date'),
+    )
+
+# Loan state on each 1 January, so balances replay from the nearest one instead of inception
+class MortgageCheckpoint(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    mortgage_id = db.Column(db.Integer, db.ForeignKey('mortgage.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False) # State before that day's events
+    balance = db.Column(db.Float, nullable=False) # Principal outstanding
+    rate = db.Column(db.Float, nullable=False)
+    accrued_interest = db.Column(db.Float, default=0.0) # Accrued but not yet paid
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_mortgage_checkpoint_mortgage_date', 'mortgage_id', 'date'),
+    )
+
 class CustomCategory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -264,6 +369,10 @@ class CustomCategory(db.Model):
     is_custom = db.Column(db.Boolean, default=True)  # True for user-added, False for defaults
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_custom_category_user_type', 'user_id', 'category_type'),
+    )
+
 class BudgetRecurring(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -275,6 +384,10 @@ class BudgetRecurring(db.Model):
     month_of_year = db.Column(db.Integer) # 1-12 (for Yearly)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_budget_recurring_user', 'user_id'),
+    )
+
 class BudgetGoal(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -295,7 +408,33 @@ class StagedImport(db.Model):
     amount = db.Column(db.Float, nullable=False)
     is_duplicate = db.Column(db.Boolean, default=False)
     duplicate_reason = db.Column(db.String(100))
+    file_row = db.Column(db.Integer) # Position in the parsed upload; maps staged ids back to preview rows
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_staged_import_user_session', 'user_id', 'session_id'),
+    )
+
+# Imports/exports handed to the background worker (see run_job)
+class BackgroundJob(db.Model):
+    id = db.Column(db.String(36), primary_key=True) # uuid4, so job ids can't be guessed
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(50), nullable=False) # Endpoint being run, e.g. 'import_transactions'
+    status = db.Column(db.String(20), default='queued') # queued, running, done, failed
+    processed = db.Column(db.Integer, default=0) # Rows read so far (imports)
+    request_data = db.Column(db.Text) # JSON: path, method, args, form and saved uploads
+    session_state = db.Column(db.Text) # JSON: session keys the job set (flash messages, import session)
+    error = db.Column(db.String(500))
+    redirect_to = db.Column(db.String(300))
+    result_path = db.Column(db.String(300))
+    result_name = db.Column(db.String(200))
+    result_mimetype = db.Column(db.String(100))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_background_job_user_created', 'user_id', 'created_at'),
+    )
 
 with app.app_context():
     db.create_all()
@@ -327,41 +466,368 @@ with app.app_context():
     except Exception as e:
         pass # Columns likely exist
 
+    # Migration for the staged import row position
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text("ALTER TABLE staged_import ADD COLUMN file_row INTEGER"))
+            conn.commit()
+    except Exception as e:
+        pass # Column likely exists
+
+    # Migrations for the cached mortgage balance
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text("ALTER TABLE mortgage ADD COLUMN cached_balance FLOAT"))
+            conn.commit()
+    except Exception as e:
+        pass # Column likely exists
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text("ALTER TABLE mortgage ADD COLUMN cached_balance_until DATE"))
+            conn.commit()
+    except Exception as e:
+        pass # Column likely exists
+    
+    # Migrations for mortgage payment interest/principal split
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text("ALTER TABLE mortgage_event ADD COLUMN interest_paid FLOAT"))
+            conn.commit()
+    except Exception as e:
+        pass # Column likely exists
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text("ALTER TABLE mortgage_event ADD COLUMN principal_paid FLOAT"))
+            conn.commit()
+    except Exception as e:
+        pass # Column likely exists
+    
+    # Migration for the payment kind: payments recorded before it were principal-only.
+    # New payments always set a kind, so the backfill is safe to repeat.
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text("ALTER TABLE mortgage_event ADD COLUMN payment_kind VARCHAR(20)"))
+            conn.commit()
+    except Exception as e:
+        pass # Column likely exists
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text("UPDATE mortgage_event SET payment_kind = 'PRINCIPAL' WHERE type = 'PAYMENT' AND payment_kind IS NULL"))
+            conn.commit()
+    except Exception as e:
+        pass
+
+    # Migration for composite indexes on hot per-user queries
+    # (create_all only builds indexes for tables it creates, so existing databases need this)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=db.engine, checkfirst=True)
+            except Exception as e:
+                pass # Index likely exists
+
+def month_start(year, month):
+    return datetime(year, month, 1).date()
+
+def next_month_start(year, month):
+    if month == 12:
+        return datetime(year + 1, 1, 1).date()
+    return datetime(year, month + 1, 1).date()
+
+def get_transaction_year_span(user_id):
+    """Returns (first_year, last_year) of a user's transactions, or None if there are none."""
+    first_date, last_date = db.session.query(
+        func.min(Transaction.date), func.max(Transaction.date)
+    ).filter(Transaction.user_id == user_id).one()
+    if first_date is None:
+        return None
+    return first_date.year, last_date.year
+
+def month_year_filter(column, month=None, year=None, year_span=None):
+    """
+    Translates a month/year selection into half-open date ranges
+    (column >= first_day AND column < next_first_day) so SQLite can range-scan
+    the (user_id, date) index instead of evaluating extract() on every row.
+    year_span (first_year, last_year) is only needed for "this month across all years".
+    Returns None when no date filter applies.
+    """
+    if month and year:
+        return and_(column >= month_start(year, month), column < next_month_start(year, month))
+    if year:
+        return and_(column >= month_start(year, 1), column < month_start(year + 1, 1))
+    if month:
+        if not year_span:
+            return None
+        first_year, last_year = year_span
+        return or_(*[
+            and_(column >= month_start(y, month), column < next_month_start(y, month))
+            for y in range(first_year, last_year + 1)
+        ])
+    return None
+
+def recurring_target_amount(item):
+    # Recurring stores positive amount + Type, Transaction stores +/- amount
+    return item.amount if item.type == 'Income' else -item.amount
+
+def get_paid_recurring_ids(user_id, recurring_items, ref_date=None):
+    """
+    Resolves which recurring items were already paid in ref_date's month (default: this month).
+    Fetches the month's (description, amount) pairs once and matches every item in memory,
+    instead of issuing one query per recurring item.
+    """
+    if not recurring_items:
+        return set()
+    ref_date = ref_date or datetime.utcnow().date()
+    names = {item.name for item in recurring_items}
+    paid_pairs = set(db.session.query(Transaction.description, Transaction.amount).filter(
+        Transaction.user_id == user_id,
+        month_year_filter(Transaction.date, ref_date.month, ref_date.year),
+        Transaction.description.in_(names)
+    ).distinct().all())
+    return {item.id for item in recurring_items if (item.name, recurring_target_amount(item)) in paid_pairs}
+
+# --- Request-scoped cache ---
+# Lookups repeated within one request (categories, prices, forex rate, account sums)
+# are memoized on flask.g and discarded when the request ends.
+
+def request_cached(name, loader):
+    cache = g.setdefault('request_cache', {})
+    if name not in cache:
+        cache[name] = loader()
+    return cache[name]
+
+def invalidate_request_cache(*names):
+    cache = g.get('request_cache', {})
+    for name in names:
+        cache.pop(name, None)
+
+def get_user_categories(category_type=None):
+    """Current user's active custom categories ordered by name, optionally of one type."""
+    categories = request_cached('categories', lambda: CustomCategory.query.filter_by(
+        user_id=session.get('user_id'), is_active=True
+    ).order_by(CustomCategory.name).all())
+    if category_type is None:
+        return categories
+    return [cat for cat in categories if cat.category_type == category_type]
+
+def get_stock_prices():
+    """All StockPrice rows keyed by symbol (includes the USDMYR market rate)."""
+    return request_cached('stock_prices', lambda: {sp.symbol: sp for sp in StockPrice.query.all()})
+
+def get_current_forex_rate():
+    # Market USD/MYR rate if one was saved, otherwise the average conversion rate
+    usd_myr_price = get_stock_prices().get('USDMYR')
+    return usd_myr_price.price if usd_myr_price else get_average_forex_rate()
+
+def get_account_balances():
+    """Current user's transaction sums per account (see get_account_sum_map)."""
+    return request_cached('account_sums', lambda: get_account_sum_map(session.get('user_id')))
+
+def get_account_sum_map(user_id, account_ids=None):
+    """
+    Sums a user's transactions per linked account in a single GROUP BY.
+    The None key holds the total of unlinked transactions (Unallocated Cash).
+    """
+    query = db.session.query(Transaction.account_id, func.sum(Transaction.amount)).filter(Transaction.user_id == user_id)
+    if account_ids is not None:
+        query = query.filter(Transaction.account_id.in_(account_ids))
+    return {acc_id: total or 0.0 for acc_id, total in query.group_by(Transaction.account_id).all()}
+
+def get_live_balance(item, account_sum_map):
+    # Live Balance = Initial Value + Transaction Sum
+    return item.value + account_sum_map.get(item.id, 0.0)
+
 def get_average_forex_rate():
-    user_id = session.get('user_id')
-    forex_txs = ForexTransaction.query.filter_by(user_id=user_id).all()
-    total_myr = sum(tx.amount_myr for tx in forex_txs)
-    total_usd = sum(tx.amount_usd for tx in forex_txs)
-    if total_usd == 0:
-        return 4.5 # Default fallback
-    return total_myr / total_usd
+    # Weighted average MYR/USD over all conversions, summed in SQL once per request
+    def load():
+        total_myr, total_usd = db.session.query(
+            func.sum(ForexTransaction.amount_myr),
+            func.sum(ForexTransaction.amount_usd)
+        ).filter(ForexTransaction.user_id == session.get('user_id')).one()
+        return total_myr / total_usd if total_usd else 4.5 # Default fallback
+    return request_cached('avg_forex_rate', load)
 
 def get_portfolio_summary():
     user_id = session.get('user_id')
-    investments = Investment.query.filter_by(user_id=user_id).all()
     avg_forex_rate = get_average_forex_rate()
-    total_invested_myr = 0
     
-    for inv in investments:
-        # Determine exchange rate to use
-        if inv.currency == 'USD':
-            rate = avg_forex_rate
-        else:
-            rate = inv.exchange_rate # Should be 1.0 for MYR
-            
-        # Calculate value in MYR
-        # For Bonus/Split, cost is 0, so no addition to invested amount
-        if inv.type in ['Buy']:
-            val_myr = ((inv.price * inv.quantity) + inv.fees) * rate
-            total_invested_myr += val_myr
-        elif inv.type == 'Sell':
-            # For Sell, we subtract the proceeds
-            proceeds_myr = ((inv.price * inv.quantity) - inv.fees) * rate
-            total_invested_myr -= proceeds_myr
-        # Dividend, Bonus, Split do not affect "Invested Capital" directly in this simple view
-        # Dividends are returns, not capital injection/removal (unless reinvested, which would be a Buy)
-            
-    return total_invested_myr
+    # Net invested capital aggregated in SQL: Buy cost minus Sell proceeds
+    # Dividend, Bonus, Split do not affect "Invested Capital" directly in this simple view
+    # Dividends are returns, not capital injection/removal (unless reinvested, which would be a Buy)
+    fees = func.coalesce(Investment.fees, 0.0)
+    net_flow = case(
+        (Investment.type == 'Buy', (Investment.price * Investment.quantity) + fees),
+        (Investment.type == 'Sell', -((Investment.price * Investment.quantity) - fees)),
+        else_=0.0
+    )
+    # USD uses the average forex rate; others use their own exchange_rate (1.0 for MYR)
+    usd_total, other_total_myr = db.session.query(
+        func.coalesce(func.sum(case((Investment.currency == 'USD', net_flow), else_=0.0)), 0.0),
+        func.coalesce(func.sum(case((Investment.currency != 'USD', net_flow * Investment.exchange_rate), else_=0.0)), 0.0)
+    ).filter(Investment.user_id == user_id).one()
+    
+    return usd_total * avg_forex_rate + other_total_myr
+
+# --- Position Engine ---
+# Positions are replayed with average cost in (date, id) order by holdings_engine. A trade dated on or after a
+# position's last replayed trade is applied incrementally; anything else (back-dated add,
+# edit, delete) replays only the affected position.
+
+def position_key(inv):
+    return (inv.user_id, inv.symbol, inv.brokerage or '')
+
+def new_position(user_id, symbol, brokerage, market, currency):
+    return Position(
+        user_id=user_id, symbol=symbol, brokerage=brokerage, market=market, currency=currency,
+        quantity=0.0, cost_basis=0.0, total_dividends=0.0, realized_pnl=0.0,
+        total_bought=0.0, total_sold=0.0, buy_cost=0.0, sell_proceeds=0.0
+    )
+
+def load_ledger(investment_query):
+    """Reads trades as plain rows into a columnar Ledger; returns (ledger, {key: (market, currency)})."""
+    ledger = Ledger()
+    meta = {}
+    rows = investment_query.with_entities(
+        Investment.user_id, Investment.symbol, Investment.brokerage, Investment.type,
+        Investment.quantity, Investment.price, Investment.fees, Investment.date,
+        Investment.id, Investment.market, Investment.currency
+    ).order_by(Investment.date, Investment.id).yield_per(5000)
+    for user_id, symbol, brokerage, trade_type, quantity, price, fees, trade_date, inv_id, market, currency in rows:
+        key = (user_id, symbol, brokerage or '')
+        ledger.append(key, trade_type, quantity, price, fees, trade_date, inv_id)
+        if key not in meta:
+            meta[key] = (market, currency)
+    return ledger, meta
+
+def apply_holdings(pos, holding):
+    for field in HOLDING_FIELDS:
+        setattr(pos, field, holding[field])
+    return pos
+
+def rebuild_position(user_id, symbol, brokerage):
+    """Replays one position's ledger from scratch (used when a trade lands out of order)."""
+    Position.query.filter_by(user_id=user_id, symbol=symbol, brokerage=brokerage).delete()
+    ledger, meta = load_ledger(Investment.query.filter(
+        Investment.user_id == user_id,
+        Investment.symbol == symbol,
+        func.coalesce(Investment.brokerage, '') == brokerage
+    ))
+    if not len(ledger):
+        return None
+    key = (user_id, symbol, brokerage)
+    pos = apply_holdings(new_position(*key, *meta[key]), compute_holdings(ledger)[key])
+    db.session.add(pos)
+    return pos
+
+def record_investment(inv):
+    """Applies a newly added investment to its position (call after flush so inv.id is set)."""
+    key = position_key(inv)
+    user_id, symbol, brokerage = key
+    pos = Position.query.filter_by(user_id=user_id, symbol=symbol, brokerage=brokerage).first()
+    initial = None
+    if pos is None:
+        pos = new_position(*key, inv.market, inv.currency)
+        db.session.add(pos)
+    elif pos.last_trade_date is not None and inv.date < pos.last_trade_date:
+        return rebuild_position(user_id, symbol, brokerage)
+    else:
+        initial = {key: {field: getattr(pos, field) for field in HOLDING_FIELDS}}
+    ledger = Ledger()
+    ledger.append(key, inv.type, inv.quantity, inv.price, inv.fees, inv.date, inv.id)
+    return apply_holdings(pos, compute_holdings(ledger, initial)[key])
+
+def refresh_positions(keys):
+    """Rebuilds each (user_id, symbol, brokerage) position once, e.g. after an edit, delete or import."""
+    db.session.flush()
+    for user_id, symbol, brokerage in set(keys):
+        rebuild_position(user_id, symbol, brokerage)
+
+def rebuild_positions(user_id=None):
+    """Full rebuild of the positions table (or one user's positions) from the Investment ledger."""
+    position_query = Position.query
+    investment_query = Investment.query
+    if user_id is not None:
+        position_query = position_query.filter_by(user_id=user_id)
+        investment_query = investment_query.filter_by(user_id=user_id)
+    position_query.delete()
+    
+    ledger, meta = load_ledger(investment_query)
+    holdings = compute_holdings(ledger)
+    db.session.add_all(
+        apply_holdings(new_position(*key, *meta[key]), holding)
+        for key, holding in holdings.items()
+    )
+    db.session.commit()
+    return len(holdings)
+
+def backfill_positions():
+    """Rebuilds every (user_id, symbol, brokerage) that has trades but no Position row (e.g. an interrupted backfill)."""
+    brokerage = func.coalesce(Investment.brokerage, '')
+    missing = db.session.query(Investment.user_id, Investment.symbol, brokerage).distinct().outerjoin(
+        Position, and_(
+            Position.user_id.is_not_distinct_from(Investment.user_id),
+            Position.symbol == Investment.symbol,
+            Position.brokerage == brokerage
+        )
+    ).filter(Position.id.is_(None)).all()
+    for user_id, symbol, brokerage in missing:
+        rebuild_position(user_id, symbol, brokerage)
+    db.session.commit()
+    return len(missing)
+
+def get_positions(user_id):
+    return Position.query.filter_by(user_id=user_id).all()
+
+POSITION_SUM_FIELDS = ['quantity', 'cost_basis', 'total_dividends', 'realized_pnl',
+                       'total_bought', 'total_sold', 'buy_cost', 'sell_proceeds']
+
+def positions_by_symbol(positions):
+    """
+    Merges per-brokerage positions into per-symbol totals (overview and balance sheet).
+    Each brokerage keeps its own average cost, so a sale's realized P&L is measured against
+    the cost of the lots held at that brokerage and the per-symbol figure is their sum; costs
+    are never blended across brokerages.
+    """
+    merged = {}
+    for pos in positions:
+        if pos.symbol not in merged:
+            merged[pos.symbol] = dict(
+                {field: 0 for field in POSITION_SUM_FIELDS},
+                market=pos.market, currency=pos.currency,
+                first_buy_date=None, last_sell_date=None,
+                avg_buy_price=0, avg_sell_price=0
+            )
+        data = merged[pos.symbol]
+        for field in POSITION_SUM_FIELDS:
+            data[field] += getattr(pos, field)
+        if pos.first_buy_date and (data['first_buy_date'] is None or pos.first_buy_date < data['first_buy_date']):
+            data['first_buy_date'] = pos.first_buy_date
+        if pos.last_sell_date and (data['last_sell_date'] is None or pos.last_sell_date > data['last_sell_date']):
+            data['last_sell_date'] = pos.last_sell_date
+    return merged
+
+@app.cli.command('rebuild-mortgages')
+def rebuild_mortgages_command():
+    """Re-derive every mortgage's payment splits and balance checkpoints from inception."""
+    mortgages = Mortgage.query.all()
+    for mortgage in mortgages:
+        MortgageCheckpoint.query.filter_by(mortgage_id=mortgage.id).delete()
+        refresh_mortgage_ledger(mortgage, mortgage.start_date)
+    db.session.commit()
+    print(f"[OK] Rebuilt {len(mortgages)} mortgages")
+
+@app.cli.command('rebuild-positions')
+def rebuild_positions_command():
+    """Rebuild the materialized Position table from all investments."""
+    count = rebuild_positions()
+    print(f"[OK] Rebuilt {count} positions")
+
+with app.app_context():
+    # Backfill positions missing from the table (databases created before it existed, interrupted backfills)
+    try:
+        backfill_positions()
+    except Exception as e:
+        db.session.rollback()
 
 
 
@@ -466,39 +932,19 @@ def logout():
 
 # ===== MAIN ROUTES =====
 
-@app.route('/', methods=['GET', 'POST'])
-@login_required
-def index():
-    if request.method == 'POST':
-        date_str = request.form['date']
-        try:
-            date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-        except ValueError:
-            date_obj = datetime.utcnow().date()
-            
-        category = request.form['category']
-        description = request.form['description']
-        try:
-            amount = float(request.form['amount'])
-        except ValueError:
-            amount = 0.0
-            
-        account_id = request.form.get('account_id')
-        if account_id and account_id.isdigit():
-            account_id = int(account_id)
-        else:
-            account_id = None
-
-        new_transaction = Transaction(date=date_obj, category=category, description=description, amount=amount, account_id=account_id, user_id=session.get('user_id'))
-        db.session.add(new_transaction)
-        db.session.commit()
-        return redirect(url_for('index'))
+TRANSACTION_PAGE_SIZE = 200
 
+def build_transaction_filters(args, user_id):
+    """
+    Builds the dashboard transaction filter conditions from request args.
+    Returns (conditions, month, year). Month/year default to the current month when
+    the parameter is absent; an empty string means "All".
+    """
     # Filtering - Default to current month if no filters specified
     current_date = datetime.now()
     # Check if month/year were explicitly provided (even if empty string)
-    month_param = request.args.get('month', type=str)
-    year_param = request.args.get('year', type=str)
+    month_param = args.get('month', type=str)
+    year_param = args.get('year', type=str)
     
     # If no parameters at all, default to current month/year
     # If empty string, user selected "All Months"
@@ -516,21 +962,18 @@ def index():
     else:
         year = int(year_param)
     
-    filter_category = request.args.get('category', type=str)
-    min_amount = request.args.get('min_amount', type=float)
-    max_amount = request.args.get('max_amount', type=float)
+    min_amount = args.get('min_amount', type=float)
+    max_amount = args.get('max_amount', type=float)
     
-    query = Transaction.query.filter_by(user_id=session.get('user_id'))
+    conditions = [Transaction.user_id == user_id]
     # Only filter by month/year if they are specified
-    if month and year:
-        query = query.filter(extract('month', Transaction.date) == month, extract('year', Transaction.date) == year)
-    elif year:
-        query = query.filter(extract('year', Transaction.date) == year)
-    elif month:
-        query = query.filter(extract('month', Transaction.date) == month)
+    year_span = get_transaction_year_span(user_id) if month and not year else None
+    date_filter = month_year_filter(Transaction.date, month, year, year_span)
+    if date_filter is not None:
+        conditions.append(date_filter)
     
     # Category filter (Multi-select)
-    filter_categories = request.args.getlist('category')
+    filter_categories = args.getlist('category')
     # Filter out empty strings which represent 'All Categories'
     filter_categories = [c for c in filter_categories if c]
     
@@ -540,8 +983,7 @@ def index():
     
     if filter_categories:
         # Get all categories to map types
-        all_cats = CustomCategory.query.filter_by(user_id=session.get('user_id'), is_active=True).all()
-        cat_map = {c.name: c.category_type for c in all_cats}
+        all_cats = get_user_categories()
         
         for cat in filter_categories:
             if cat in ['Income', 'Expense', 'Savings']:
@@ -553,58 +995,140 @@ def index():
                 effective_categories.add(cat)
                 
         if effective_categories:
-            query = query.filter(Transaction.category.in_(effective_categories))
+            conditions.append(Transaction.category.in_(effective_categories))
     
     # Amount range filters
     if min_amount is not None:
-        query = query.filter(Transaction.amount >= min_amount)
+        conditions.append(Transaction.amount >= min_amount)
     if max_amount is not None:
-        query = query.filter(Transaction.amount <= max_amount)
-        
-    transactions = query.order_by(Transaction.date.desc()).all()
+        conditions.append(Transaction.amount <= max_amount)
+    
+    return conditions, month, year
+
+def encode_transaction_cursor(transaction):
+    return f"{transaction.date.strftime('%Y-%m-%d')}_{transaction.id}"
+
+def decode_transaction_cursor(cursor):
+    date_str, id_str = cursor.split('_')
+    return datetime.strptime(date_str, '%Y-%m-%d').date(), int(id_str)
+
+def get_transaction_page(conditions, cursor=None, limit=TRANSACTION_PAGE_SIZE):
+    """
+    Keyset pagination on (date desc, id desc): each page continues strictly after the
+    cursor row, so deep pages cost the same as the first one.
+    Returns (transactions, next_cursor); next_cursor is None on the last page.
+    """
+    query = Transaction.query.filter(*conditions)
+    if cursor:
+        cursor_date, cursor_id = decode_transaction_cursor(cursor)
+        query = query.filter(or_(
+            Transaction.date < cursor_date,
+            and_(Transaction.date == cursor_date, Transaction.id < cursor_id)
+        ))
+    rows = query.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_transaction_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def get_daily_totals(conditions, dates):
+    """Per-day sums over the full filter, so a day split across pages still shows its full total."""
+    if not dates:
+        return {}
+    rows = db.session.query(Transaction.date, func.sum(Transaction.amount)).filter(
+        *conditions, Transaction.date.in_(dates)
+    ).group_by(Transaction.date).all()
+    return {date: total for date, total in rows}
+
+def get_transaction_totals(conditions, user_id):
+    """
+    Returns (balance, spent, saved) for a transaction filter in one aggregate query.
+    Spent/saved follow the category type, resolved by joining custom_category on name
+    (one row per name, so a name reused across types is never double counted).
+    """
+    category_types = db.session.query(
+        CustomCategory.name.label('name'),
+        func.max(CustomCategory.category_type).label('category_type')
+    ).filter_by(user_id=user_id, is_active=True).group_by(CustomCategory.name).subquery()
+    
+    balance, spent, saved = db.session.query(
+        func.coalesce(func.sum(Transaction.amount), 0.0),
+        # Amount is negative for expense
+        func.coalesce(func.sum(case((category_types.c.category_type == 'Expense', Transaction.amount), else_=0.0)), 0.0),
+        # Treat transfers as positive savings
+        func.coalesce(func.sum(case((category_types.c.category_type == 'Savings', func.abs(Transaction.amount)), else_=0.0)), 0.0)
+    ).select_from(Transaction).outerjoin(
+        category_types, category_types.c.name == Transaction.category
+    ).filter(*conditions).one()
+    return balance, spent, saved
+
+def group_transactions_by_date(transactions):
+    from itertools import groupby
+    from operator import attrgetter
+    
+    transactions_by_date = {}
+    for date, group in groupby(transactions, key=attrgetter('date')):
+        transactions_by_date[date] = list(group)
+    return transactions_by_date
+
+@app.route('/', methods=['GET', 'POST'])
+@login_required
+def index():
+    if request.method == 'POST':
+        date_str = request.form['date']
+        try:
+            date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            date_obj = datetime.utcnow().date()
+            
+        category = request.form['category']
+        description = request.form['description']
+        try:
+            amount = float(request.form['amount'])
+        except ValueError:
+            amount = 0.0
+            
+        account_id = request.form.get('account_id')
+        if account_id and account_id.isdigit():
+            account_id = int(account_id)
+        else:
+            account_id = None
+
+        new_transaction = Transaction(date=date_obj, category=category, description=description, amount=amount, account_id=account_id, user_id=session.get('user_id'))
+        db.session.add(new_transaction)
+        db.session.commit()
+        return redirect(url_for('index'))
+
+    conditions, month, year = build_transaction_filters(request.args, session.get('user_id'))
+    filter_category = request.args.get('category', type=str)
+    min_amount = request.args.get('min_amount', type=float)
+    max_amount = request.args.get('max_amount', type=float)
+    
+    # Only the first page is rendered; the rest is loaded on scroll via /api/transactions
+    transactions, next_cursor = get_transaction_page(conditions)
+    daily_totals = get_daily_totals(conditions, {t.date for t in transactions})
     
     # Calculate Total Balance (Global for the user or for current selection)
     # Note: total_balance on dashboard usually represents Net Worth (sum of accounts)
     # but here we use the sum of selected transactions as per previous logic
-    total_balance = sum(t.amount for t in transactions)
-    # Also calculate spent and saved for the selection
-    total_spent = sum(t.amount for t in transactions if t.amount < 0)
-    total_saved = sum(t.amount for t in transactions if t.category in [c.name for c in CustomCategory.query.filter_by(user_id=session.get('user_id'), category_type='Savings').all()])
+    # --- V2.4 Savings Separation Logic: spent/saved follow the Category Type ---
+    # Totals are aggregated in SQL over the full filter, not just the rendered page
+    total_balance, total_spent, total_saved = get_transaction_totals(conditions, session.get('user_id'))
     
     # Get Accounts (BalanceItems) for Dropdown (Assets & Liabilities)
     accounts = BalanceItem.query.filter(BalanceItem.classification.in_(['Current Asset', 'Current Liability']), BalanceItem.user_id == session.get('user_id')).all()
     
     # Calculate Live Balance for each Account
+    account_sum_map = get_account_balances()
     for account in accounts:
-        # Sum of linked transactions
-        tx_sum = db.session.query(func.sum(Transaction.amount)).filter(Transaction.account_id == account.id, Transaction.user_id == session.get('user_id')).scalar() or 0.0
-        # Live Balance = Initial Value + Transaction Sum
-        account.current_balance = account.value + tx_sum
+        account.current_balance = get_live_balance(account, account_sum_map)
     
     # --- Recurring Items Logic (Added in V2.2) ---
     recurring_items = BudgetRecurring.query.filter_by(user_id=session.get('user_id')).all()
-    pending_recurring = []
     
     current_date = datetime.utcnow().date()
     
-    for item in recurring_items:
-        # Check if paid in CURRENT MONTH
-        # Match criterias: Same Amount (Approx), Description matches Name
-        # Amount match needs to consider sign? Recurring stores positive amount + Type.
-        # Transaction stores +/- amount.
-        target_amount = item.amount if item.type == 'Income' else -item.amount
-        
-        # Check query
-        is_paid = Transaction.query.filter(
-            Transaction.user_id == session.get('user_id'),
-            extract('month', Transaction.date) == current_date.month,
-            extract('year', Transaction.date) == current_date.year,
-            Transaction.description == item.name,
-            Transaction.amount == target_amount
-        ).first()
-        
-        if not is_paid:
-            pending_recurring.append(item)
+    # Paid in CURRENT MONTH = a transaction with Description == Name and the signed amount
+    paid_ids = get_paid_recurring_ids(session.get('user_id'), recurring_items, current_date)
+    pending_recurring = [item for item in recurring_items if item.id not in paid_ids]
 
     # Get available years for filter
     years = db.session.query(extract('year', Transaction.date)).filter(Transaction.user_id == session.get('user_id')).distinct().order_by(extract('year', Transaction.date).desc()).all()
@@ -614,51 +1138,20 @@ def index():
     current_year = year
 
     # Get user's custom categories
-    income_categories = CustomCategory.query.filter_by(
-        user_id=session.get('user_id'),
-        category_type='Income',
-        is_active=True
-    ).order_by(CustomCategory.name).all()
-    
-    expense_categories = CustomCategory.query.filter_by(
-        user_id=session.get('user_id'),
-        category_type='Expense',
-        is_active=True
-    ).order_by(CustomCategory.name).all()
+    income_categories = get_user_categories('Income')
+    expense_categories = get_user_categories('Expense')
 
     # Group transactions by date for v2.2.1
-    from itertools import groupby
-    from operator import attrgetter
-    
-    transactions_by_date = {}
-    for date, group in groupby(transactions, key=attrgetter('date')):
-        transactions_by_date[date] = list(group)
+    transactions_by_date = group_transactions_by_date(transactions)
 
-    # --- V2.4 Savings Separation Logic ---
-    # Fetch all user categories to map names to types
-    all_cats = CustomCategory.query.filter_by(user_id=session.get('user_id'), is_active=True).all()
-    cat_type_map = {c.name: c.category_type for c in all_cats}
-    
-    total_spent = 0.0
-    total_saved = 0.0
-    
-    for t in transactions:
-        # Determine type (default 'Expense' if unknown and negative, 'Income' if positive)
-        # But for separation, we rely on the Category Type.
-        ctype = cat_type_map.get(t.category)
-        
-        if ctype == 'Expense':
-            total_spent += t.amount # Amount is negative for expense
-        elif ctype == 'Savings':
-            total_saved += abs(t.amount) # Treat transfers as positive savings
-            
     # Get Saving Categories for Dropdown
-    savings_categories = [c for c in all_cats if c.category_type == 'Savings']
-    savings_categories.sort(key=lambda x: x.name)
+    savings_categories = get_user_categories('Savings')
 
     return render_template('index.html', 
         transactions=transactions, 
         transactions_by_date=transactions_by_date,
+        daily_totals=daily_totals,
+        next_cursor=next_cursor,
         total_balance=total_balance, 
         total_spent=total_spent,
         total_saved=total_saved,
@@ -675,6 +1168,31 @@ def index():
         pending_recurring=pending_recurring, 
         current_date=current_date)
 
+@app.route('/api/transactions', methods=['GET'])
+@login_required
+def get_transactions_page():
+    """Next page of the dashboard transaction list (infinite scroll), same filters as index()"""
+    conditions, month, year = build_transaction_filters(request.args, session.get('user_id'))
+    try:
+        transactions, next_cursor = get_transaction_page(conditions, cursor=request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+    daily_totals = get_daily_totals(conditions, {t.date for t in transactions})
+    
+    return jsonify({
+        'success': True,
+        'transactions': [{
+            'id': t.id,
+            'date': t.date.strftime('%Y-%m-%d'),
+            'category': t.category,
+            'description': t.description,
+            'amount': t.amount,
+            'account_id': t.account_id
+        } for t in transactions],
+        'daily_totals': {d.strftime('%Y-%m-%d'): total for d, total in daily_totals.items()},
+        'next_cursor': next_cursor
+    })
+
 @app.route('/recurring/post/<int:id>', methods=['POST'])
 @login_required
 def post_recurring(id):
@@ -682,7 +1200,12 @@ def post_recurring(id):
     
     # Create Transaction (Date = Today)
     today = datetime.utcnow().date()
-    amount = item.amount if item.type == 'Income' else -item.amount
+    amount = recurring_target_amount(item)
+    
+    # Guard against double-posting (e.g. resubmitted form)
+    if item.id in get_paid_recurring_ids(session.get('user_id'), [item], today):
+        flash(f'{item.name} is already posted for this month.', 'info')
+        return redirect(url_for('index'))
     
     new_tx = Transaction(
         date=today,
@@ -768,6 +1291,7 @@ def delete_mortgage(id):
     mortgage = Mortgage.query.filter_by(id=id, user_id=session.get('user_id')).first_or_404()
     # Delete associated events first
     MortgageEvent.query.filter_by(mortgage_id=id).delete()
+    MortgageCheckpoint.query.filter_by(mortgage_id=id).delete()
     db.session.delete(mortgage)
     db.session.commit()
     return redirect(url_for('balance_sheet'))
@@ -790,12 +1314,11 @@ def chart_data():
     expenses_query = db.session.query(Transaction.category, func.sum(Transaction.amount)).filter(Transaction.amount < 0, Transaction.user_id == session.get('user_id'))
     income_query = db.session.query(Transaction.category, func.sum(Transaction.amount)).filter(Transaction.amount > 0, Transaction.user_id == session.get('user_id'))
 
-    if month and year:
-        expenses_query = expenses_query.filter(extract('month', Transaction.date) == month, extract('year', Transaction.date) == year)
-        income_query = income_query.filter(extract('month', Transaction.date) == month, extract('year', Transaction.date) == year)
-    elif year:
-        expenses_query = expenses_query.filter(extract('year', Transaction.date) == year)
-        income_query = income_query.filter(extract('year', Transaction.date) == year)
+    # Month only applies together with a year here (matches the chart page selectors)
+    date_filter = month_year_filter(Transaction.date, month, year) if year else None
+    if date_filter is not None:
+        expenses_query = expenses_query.filter(date_filter)
+        income_query = income_query.filter(date_filter)
 
     expenses = expenses_query.group_by(Transaction.category).all()
     income = income_query.group_by(Transaction.category).all()
@@ -815,7 +1338,7 @@ def portfolio():
     
     # Handle Custom Forex Rate (Current Market Rate)
     # Stored in StockPrice with symbol 'USDMYR'
-    usd_myr_price = StockPrice.query.get('USDMYR')
+    usd_myr_price = get_stock_prices().get('USDMYR')
     
     if custom_rate_arg:
         try:
@@ -826,6 +1349,7 @@ def portfolio():
             else:
                 usd_myr_price.price = current_forex_rate
             db.session.commit()
+            invalidate_request_cache('stock_prices')
         except ValueError:
             current_forex_rate = usd_myr_price.price if usd_myr_price else avg_forex_rate
     else:
@@ -833,43 +1357,21 @@ def portfolio():
         
     investments = Investment.query.filter_by(user_id=session.get('user_id')).order_by(Investment.date.desc()).all()
     
-    # Calculate Holdings - Group by (symbol, brokerage)
+    # Holdings - Group by (symbol, brokerage), read from the materialized positions
     holdings = {}
     first_buy_dates = {} # Track first buy date for annualized return
 
-    for inv in investments:
-        # Use tuple (symbol, brokerage) as key to separate holdings by brokerage
-        key = (inv.symbol, inv.brokerage or '')
-        
-        if key not in holdings:
-            holdings[key] = {
-                'quantity': 0, 'cost_basis': 0, 'market': inv.market, 'currency': inv.currency,
-                'total_dividends': 0, 'brokerage': inv.brokerage or ''
-            }
-        
-        # Track first buy date per (symbol, brokerage)
-        if inv.type == 'Buy':
-            if key not in first_buy_dates or inv.date < first_buy_dates[key]:
-                first_buy_dates[key] = inv.date
-
-        if inv.type == 'Buy':
-            holdings[key]['quantity'] += inv.quantity
-            holdings[key]['cost_basis'] += (inv.price * inv.quantity) + inv.fees
-        elif inv.type == 'Sell':
-            if holdings[key]['quantity'] > 0:
-                # Reduce cost basis proportionally
-                avg_cost = holdings[key]['cost_basis'] / holdings[key]['quantity']
-                cost_removed = avg_cost * inv.quantity
-                holdings[key]['cost_basis'] -= cost_removed
-                holdings[key]['quantity'] -= inv.quantity
-        elif inv.type in ['Bonus', 'Split']:
-            holdings[key]['quantity'] += inv.quantity
-            # Cost basis does not change for Bonus/Split
-        elif inv.type == 'Dividend':
-            holdings[key]['total_dividends'] += inv.price # Price here stores the total dividend amount
+    for pos in get_positions(session.get('user_id')):
+        key = (pos.symbol, pos.brokerage)
+        holdings[key] = {
+            'quantity': pos.quantity, 'cost_basis': pos.cost_basis, 'market': pos.market, 'currency': pos.currency,
+            'total_dividends': pos.total_dividends, 'brokerage': pos.brokerage
+        }
+        if pos.first_buy_date:
+            first_buy_dates[key] = pos.first_buy_date
             
     # Get current prices
-    stock_prices = {sp.symbol: sp.price for sp in StockPrice.query.all()}
+    stock_prices = {symbol: sp.price for symbol, sp in get_stock_prices().items()}
 
     # Prepare display data based on view_currency
     display_holdings = {}
@@ -1005,6 +1507,8 @@ def add_investment():
             user_id=session.get('user_id')
         )
         db.session.add(new_inv)
+        db.session.flush() # Get ID
+        record_investment(new_inv)
         db.session.commit()
         return redirect(url_for('portfolio'))
     
@@ -1049,6 +1553,7 @@ def forex():
         new_forex = ForexTransaction(date=date_obj, amount_myr=amount_myr, rate=rate, amount_usd=amount_usd, user_id=session.get('user_id'))
         db.session.add(new_forex)
         db.session.commit()
+        invalidate_request_cache('avg_forex_rate')
         return redirect(url_for('forex'))
         
     forex_txs = ForexTransaction.query.filter_by(user_id=session.get('user_id')).order_by(ForexTransaction.date.desc()).all()
@@ -1112,7 +1617,8 @@ def update_prices():
 def budget():
     recurring_items = BudgetRecurring.query.filter_by(user_id=session.get('user_id')).order_by(BudgetRecurring.created_at.desc()).all()
     goals = BudgetGoal.query.filter_by(user_id=session.get('user_id')).order_by(BudgetGoal.target_date).all()
-    return render_template('budget.html', recurring_items=recurring_items, goals=goals)
+    paid_recurring_ids = get_paid_recurring_ids(session.get('user_id'), recurring_items)
+    return render_template('budget.html', recurring_items=recurring_items, goals=goals, paid_recurring_ids=paid_recurring_ids)
 
 @app.route('/budget/recurring/add', methods=['POST'])
 @login_required
@@ -1179,8 +1685,12 @@ def edit_investment(id):
     inv = Investment.query.filter_by(id=id, user_id=session.get('user_id')).first_or_404()
     remark = request.form.get('remark', '')
     brokerage = request.form.get('brokerage', '')
+    old_key = position_key(inv)
     inv.remark = remark
     inv.brokerage = brokerage
+    # Changing brokerage moves the trade to another position
+    if position_key(inv) != old_key:
+        refresh_positions([old_key, position_key(inv)])
     db.session.commit()
     return redirect(url_for('portfolio'))
 
@@ -1188,7 +1698,9 @@ def edit_investment(id):
 @login_required
 def delete_investment(id):
     inv = Investment.query.filter_by(id=id, user_id=session.get('user_id')).first_or_404()
+    key = position_key(inv)
     db.session.delete(inv)
+    refresh_positions([key])
     db.session.commit()
     return redirect(url_for('portfolio'))
 
@@ -1196,174 +1708,117 @@ def delete_investment(id):
 
 # --- Balance Sheet Logic ---
 
-def calculate_mortgage_balance(mortgage):
+def nearest_mortgage_states(mortgages, as_of):
     """
-    Calculates the current balance of a mortgage by replaying events.
+    {mortgage id: (state, events)}: loan state from each mortgage's latest checkpoint on
+    or before as_of, plus the events to replay on top of it (up to and including as_of).
+    Without a checkpoint the replay starts at inception. Two queries for any number of mortgages.
     """
-    current_balance = mortgage.original_principal
-    # Events should be ordered by date
-    events = sorted(mortgage.events, key=lambda x: x.date)
-    
-    # In a full implementation, we'd calculate daily interest.
-    # For now, we assume simple principal reduction from payments.
-    # The user manual entry or detailed scheduler will handle interest adjustments.
-    # This function returns the "Principal Outstanding".
-    
-    for event in events:
-        if event.type == 'PAYMENT':
-             # Assumption: event.value is the principal portion paid? 
-             # Or total payment? 
-             # For Balance Sheet Summary, we need Principal Balance.
-             # Let's assume for now the user records "Principal Paid" or we track balance_after.
-             if event.balance_after is not None:
-                 current_balance = event.balance_after
-             else:
-                 # Fallback if balance_after not set (e.g. simple payment subtraction)
-                 # This is a simplification; verify with user preference if they want interest calc here.
-                 pass 
-                 
-    # If no events, balance is original principal.
-    # If events exist, we take the last known balance.
-    if events and events[-1].balance_after:
-        return events[-1].balance_after
-        
-    return current_balance
-
-def add_months(sourcedate, months):
-    month = sourcedate.month - 1 + months
-    year = sourcedate.year + month // 12
-    month = month % 12 + 1
-    day = min(sourcedate.day, [31,
-        29 if year % 4 == 0 and not year % 100 == 0 or year % 400 == 0 else 28,
-        31, 30, 31, 30, 31, 31, 30, 31, 30, 31][month - 1])
-    return datetime(year, month, day).date()
+    from collections import defaultdict
+    
+    ids = [m.id for m in mortgages]
+    latest = db.session.query(
+        MortgageCheckpoint.mortgage_id, func.max(MortgageCheckpoint.date).label('date')
+    ).filter(MortgageCheckpoint.mortgage_id.in_(ids), MortgageCheckpoint.date <= as_of)\
+        .group_by(MortgageCheckpoint.mortgage_id).subquery()
+    checkpoints = {c.mortgage_id: c for c in MortgageCheckpoint.query.join(latest, and_(
+        MortgageCheckpoint.mortgage_id == latest.c.mortgage_id, MortgageCheckpoint.date == latest.c.date))}
+    
+    events_by_mortgage = defaultdict(list)
+    for event in MortgageEvent.query.outerjoin(latest, MortgageEvent.mortgage_id == latest.c.mortgage_id).filter(
+            MortgageEvent.mortgage_id.in_(ids),
+            MortgageEvent.date <= as_of,
+            or_(latest.c.date.is_(None), MortgageEvent.date >= latest.c.date)
+    ).order_by(MortgageEvent.date, MortgageEvent.id):
+        events_by_mortgage[event.mortgage_id].append(event)
+    
+    states = {}
+    for mortgage in mortgages:
+        checkpoint = checkpoints.get(mortgage.id)
+        events = events_by_mortgage[mortgage.id]
+        if checkpoint:
+            state = LoanState(checkpoint.date, checkpoint.balance, checkpoint.rate, checkpoint.accrued_interest or 0.0)
+        else:
+            state = opening_state(mortgage, events)
+        states[mortgage.id] = (state, events)
+    return states
 
-def generate_mortgage_schedule(mortgage):
-    schedule = []
+def refresh_mortgage_ledger(mortgage, from_date):
+    """
+    Re-derives payment splits, balance_after and the yearly checkpoints from from_date
+    on, after an event was recorded there. Checkpoints up to from_date stay valid, so the
+    replay resumes from the nearest one rather than from inception, and every checkpoint
+    it passes is stored (including any missing before from_date). The caller commits.
+    """
+    today = datetime.utcnow().date()
+    db.session.flush()
+    MortgageCheckpoint.query.filter(
+        MortgageCheckpoint.mortgage_id == mortgage.id,
+        MortgageCheckpoint.date > from_date
+    ).delete(synchronize_session=False)
+    
+    state, events = nearest_mortgage_states([mortgage], from_date)[mortgage.id]
+    later_events = MortgageEvent.query.filter(
+        MortgageEvent.mortgage_id == mortgage.id,
+        MortgageEvent.date > from_date
+    ).order_by(MortgageEvent.date, MortgageEvent.id).all()
+    splits, checkpoints = apply_events(state, events + later_events, app.config['MORTGAGE_ACCRUAL'],
+                                       until=max(today, from_date))
+    
+    mortgage.cached_balance = None
+    for event, interest, principal, balance_after in splits:
+        event.interest_paid = interest
+        event.principal_paid = principal
+        event.balance_after = balance_after
+    bulk_insert(MortgageCheckpoint, [{
+        'mortgage_id': mortgage.id,
+        'date': checkpoint.date,
+        'balance': checkpoint.balance,
+        'rate': checkpoint.rate,
+        'accrued_interest': checkpoint.accrued,
+        'user_id': mortgage.user_id
+    } for checkpoint in checkpoints])
+
+def get_mortgage_balances(mortgages):
+    """
+    {mortgage id: principal outstanding today}. Balances come from the cache on the
+    Mortgage row; stale ones resume from their nearest checkpoint (loaded for all of them
+    at once) and are cached until their next event date.
+    The cache is written in its own transaction and set as already-committed state on
+    the loaded rows, so callers' objects are not expired (and reloaded one by one).
+    """
+    from sqlalchemy import bindparam
+    from sqlalchemy.orm.attributes import set_committed_value
     
-    # 1. Timeline & Events
-    start_date = mortgage.start_date
-    end_date = add_months(start_date, mortgage.term_years * 12)
     today = datetime.utcnow().date()
+    stale = [m for m in mortgages if m.cached_balance is None
+             or (m.cached_balance_until is not None and m.cached_balance_until <= today)]
+    if stale:
+        states = nearest_mortgage_states(stale, today)
+        next_event_dates = dict(db.session.query(MortgageEvent.mortgage_id, func.min(MortgageEvent.date)).filter(
+            MortgageEvent.mortgage_id.in_([m.id for m in stale]), MortgageEvent.date > today
+        ).group_by(MortgageEvent.mortgage_id).all())
+        
+        cache_rows = []
+        for mortgage in stale:
+            state, events = states[mortgage.id]
+            apply_events(state, events, app.config['MORTGAGE_ACCRUAL'])
+            valid_until = next_event_dates.get(mortgage.id)
+            set_committed_value(mortgage, 'cached_balance', state.balance)
+            set_committed_value(mortgage, 'cached_balance_until', valid_until)
+            cache_rows.append({'mortgage_id': mortgage.id, 'balance': state.balance, 'until': valid_until})
+        
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(update(Mortgage.__table__).where(Mortgage.__table__.c.id == bindparam('mortgage_id')).values(
+                    cached_balance=bindparam('balance'), cached_balance_until=bindparam('until')), cache_rows)
+        except OperationalError:
+            pass # Database busy; the balances are recomputed next time
     
-    events = sorted(mortgage.events, key=lambda x: x.date)
-    
-    # Track Simulation State
-    curr_balance = mortgage.original_principal
-    curr_rate = 0.0
-    
-    # Initial Rate
-    init_rate_event = next((e for e in events if e.type == 'RATE_CHANGE'), None)
-    if init_rate_event:
-        curr_rate = init_rate_event.value
-        
-    # MRTA State - Fixed Schedule based on inception
-    mrta_balance = mortgage.mrta_original_amount if mortgage.has_mrta else 0
-    mrta_rate = mortgage.mrta_rate if mortgage.has_mrta else 0
-    # Calculate fixed monthly PMT for MRTA schedule
-    mrta_pmt = 0
-    if mortgage.has_mrta and mrta_rate > 0:
-        r = mrta_rate / 100 / 12
-        n = mortgage.term_years * 12
-        if r > 0:
-            mrta_pmt = (mrta_balance * r * (1 + r)**n) / ((1 + r)**n - 1)
-        else:
-            mrta_pmt = mrta_balance / n
-
-    # --- HISTORICAL REPLAY ---
-    # We iterate month by month from start_date until today
-    
-    # Naive assumption: Payments happen on the same day of month as start_date
-    # Better approach: Just list all months, and see if there was a PAYMENT event in that month?
-    # OR: Just show the official "Due Dates" and map actual payments to them.
-    # To simplify: We just generate a monthly schedule.
-    
-    total_months = mortgage.term_years * 12
-    
-    last_event_idx = 0
-    
-    for i in range(total_months + 1): # +1 to show opening
-        date = add_months(start_date, i)
-        
-        # Process events up to this date
-        while last_event_idx < len(events) and events[last_event_idx].date <= date:
-            evt = events[last_event_idx]
-            if evt.type == 'RATE_CHANGE':
-                curr_rate = evt.value
-            elif evt.type == 'PAYMENT':
-                # Payment reduces balance immediately
-                # Logic: We display the payment in the schedule row corresponding to the month
-                pass 
-            last_event_idx += 1
-
-        # Calculate MRTA Balance for this month (Standard Amortization)
-        # B_k = B_0 * ... formula or iterative
-        # Iterative is safer
-        if i > 0 and mortgage.has_mrta:
-             interest = mrta_balance * (mrta_rate / 100 / 12)
-             principal_part = mrta_pmt - interest
-             mrta_balance -= principal_part
-             if mrta_balance < 0: mrta_balance = 0
-        
-        row = {
-            'no': i,
-            'date': date,
-            'rate': curr_rate,
-            'mrta_coverage': mrta_balance if mortgage.has_mrta else 0,
-            'net_exposure': max(0, curr_balance - (mrta_balance if mortgage.has_mrta else 0))
-        }
+    return {m.id: m.cached_balance for m in mortgages}
 
-        # Handling Actuals vs Future
-        if date <= today:
-            row['type'] = 'History'
-            row['balance'] = curr_balance # Should we try to find the EXACT balance at this date?
-            # Ideally we recalculate balance month-by-month.
-            # But we have `calculate_mortgage_balance` which gives valid snapshot.
-            # Simplified: For history, we just show "Current Balance" as it stands. 
-            # (Refining this requires a daily interest calculator which is too complex for this step).
-            # Current simplified model: Events dictate balance.
-            
-            # Find payment in this month
-            payment_evt = next((e for e in mortgage.events if e.type=='PAYMENT' and e.date.year==date.year and e.date.month==date.month), None)
-            if payment_evt:
-                row['payment'] = payment_evt.value
-                row['balance'] = payment_evt.balance_after
-                curr_balance = payment_evt.balance_after # Update runner
-            else:
-                row['payment'] = 0
-                row['balance'] = curr_balance
-                
-            row['interest_paid'] = 0 # Todo: calculate interest component
-            row['principal_paid'] = 0
-            
-        else:
-            row['type'] = 'Projected'
-            # Calculate PMT for remaining balance
-            # Remaining n
-            remaining_months = total_months - i + 1
-            if remaining_months <= 0: break
-            
-            r = curr_rate / 100 / 12
-            if r > 0 and curr_balance > 0:
-                pmt = (curr_balance * r * (1 + r)**remaining_months) / ((1 + r)**remaining_months - 1)
-            else:
-                pmt = curr_balance / remaining_months if remaining_months > 0 else 0
-            
-            interest = curr_balance * r
-            principal = pmt - interest
-            curr_balance -= principal
-            if curr_balance < 0: curr_balance = 0
-            
-            row['payment'] = pmt
-            row['interest_paid'] = interest
-            row['principal_paid'] = principal
-            row['balance'] = curr_balance
-            row['net_exposure'] = max(0, curr_balance - row['mrta_coverage'])
-            
-        schedule.append(row)
-        if curr_balance <= 0 and i > 0: break # Paid off
-        
-    return schedule
+def generate_mortgage_schedule(mortgage):
+    return build_schedule(mortgage, datetime.utcnow().date(), app.config['MORTGAGE_ACCRUAL'])
 
 @app.route('/mortgage/<int:id>', methods=['GET'])
 @login_required
@@ -1374,9 +1829,7 @@ def mortgage_detail(id):
     schedule = generate_mortgage_schedule(mortgage)
     
     # Get current snapshot
-    current_balance = schedule[-1]['balance'] # Or calculate strictly
-    # Better: use helper
-    current_balance = calculate_mortgage_balance(mortgage)
+    current_balance = get_mortgage_balances([mortgage])[mortgage.id]
     
     # Current Rate
     rate_events = [e for e in mortgage.events if e.type == 'RATE_CHANGE']
@@ -1404,20 +1857,66 @@ def mortgage_detail(id):
                            net_exposure=max(0, current_balance - current_mrta),
                            schedule=schedule)
 
-@app.route('/mortgage/<int:id>/update_rate', methods=['POST'])
+@app.route('/api/mortgage/<int:id>/simulate', methods=['POST'])
 @login_required
-def update_mortgage_rate(id):
+def simulate_mortgage(id):
+    """
+    What-if scenarios for a mortgage, all evaluated in one pass over its projected schedule.
+    Body: {"scenarios": [{"name", "extra_monthly", "lump_sums": [{"date", "amount"}],
+    "rate_shocks": [{"date", "delta"}], "refinance": {"date", "rate", "term_years"}}, ...]}
+    """
     mortgage = Mortgage.query.filter_by(id=id, user_id=session.get('user_id')).first_or_404()
-    new_rate = float(request.form['new_rate'])
-    date_str = request.form['date']
-    date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-    
+    data = request.get_json(silent=True) or {}
+    specs = data.get('scenarios')
+    if not isinstance(specs, list) or not specs:
+        return jsonify({'success': False, 'error': 'Provide a non-empty "scenarios" list'}), 400
+    if len(specs) > MAX_SCENARIOS:
+        return jsonify({'success': False, 'error': f'At most {MAX_SCENARIOS} scenarios per request'}), 400
+    try:
+        scenarios = [Scenario({'name': 'Baseline'})] + [Scenario(spec, i) for i, spec in enumerate(specs)]
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    dates, results = simulate_scenarios(mortgage, generate_mortgage_schedule(mortgage), scenarios)
+    baseline = results[0]
+    
+    def describe(scenario, result):
+        payoff = result['payoff_date']
+        months_saved = None
+        if payoff and baseline['payoff_date']:
+            months_saved = (baseline['payoff_date'].year - payoff.year) * 12 + baseline['payoff_date'].month - payoff.month
+        return {
+            'name': scenario.name,
+            'total_interest': round(result['total_interest'], 2),
+            'total_paid': round(result['total_paid'], 2),
+            'interest_saved': round(baseline['total_interest'] - result['total_interest'], 2),
+            'payoff_date': payoff.isoformat() if payoff else None,
+            'months_saved': months_saved,
+            'net_exposure': [round(value, 2) for value in result['net_exposure']]
+        }
+    
+    return jsonify({
+        'success': True,
+        'dates': [d.isoformat() for d in dates],
+        'baseline': describe(scenarios[0], baseline),
+        'scenarios': [describe(scenario, result) for scenario, result in zip(scenarios[1:], results[1:])]
+    })
+
+@app.route('/mortgage/<int:id>/update_rate', methods=['POST'])
+@login_required
+def update_mortgage_rate(id):
+    mortgage = Mortgage.query.filter_by(id=id, user_id=session.get('user_id')).first_or_404()
+    new_rate = float(request.form['new_rate'])
+    date_str = request.form['date']
+    date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
+    
     # We need to know the balance at this date to ensure continuity?
     # Not strictly, but helps. 
     # For now, just record the event. The scheduler handles logic.
     
     evt = MortgageEvent(mortgage_id=id, date=date_obj, type='RATE_CHANGE', value=new_rate, user_id=session.get('user_id'))
     db.session.add(evt)
+    refresh_mortgage_ledger(mortgage, date_obj) # Interest after this date changes
     db.session.commit()
     return redirect(url_for('mortgage_detail', id=id))
 
@@ -1429,25 +1928,16 @@ def add_mortgage_payment(id):
     date_str = request.form['date']
     date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
     
-    # Calculate balance after this payment
-    # This requires replaying all events up to this date
-    # Simplification: Fetch current balance, subtract amount.
-    current_bal = calculate_mortgage_balance(mortgage)
-    new_bal = current_bal - amount # Assuming principal payment mainly
-    # If standard monthly payment (Principal + Interest), we need to split.
-    # For MVP: User enters "Principal Paid" or we handle total payment logic later.
-    # Let's assume user enters TOTAL payment and we deduce? No, too complex.
-    # Let's assume user enters PRINCIPAL reduction (Safe).
-    # OR: just record balance_after manually? No, user doesn't know.
-    
-    # MVP approach: Just subtract from current balance. Refine later.
-    
+    # The amount is the total paid: interest accrued since the last payment is settled
+    # first and the rest reduces principal. Replaying from this date fills in the split
+    # and balance_after (and re-derives later payments if this one is back-dated).
     evt = MortgageEvent(
         mortgage_id=id, date=date_obj, type='PAYMENT', 
-        value=amount, balance_after=new_bal,
+        value=amount, payment_kind=PAYMENT_TOTAL,
         user_id=session.get('user_id')
     )
     db.session.add(evt)
+    refresh_mortgage_ledger(mortgage, date_obj)
     db.session.commit()
     return redirect(url_for('mortgage_detail', id=id))
 
@@ -1489,28 +1979,16 @@ def balance_sheet():
 
     # 1. Get Auto-Linked Cash (Current Asset) - Unallocated Only
     # Only sum transactions that are NOT linked to a specific account
-    transactions = Transaction.query.filter_by(user_id=session.get('user_id')).all()
-    total_cash = sum(t.amount for t in transactions if t.account_id is None)
+    account_sum_map = get_account_balances()
+    total_cash = account_sum_map.get(None, 0.0)
     
     # 2. Get Auto-Linked Investments (Non-Current Asset)
-    # Using existing logic logic from portfolio_overview to get Market Value in MYR
-    investments = Investment.query.filter_by(user_id=session.get('user_id')).all()
-    avg_forex_rate = get_average_forex_rate()
-    usd_myr_price = StockPrice.query.get('USDMYR')
-    current_forex_rate = usd_myr_price.price if usd_myr_price else avg_forex_rate
-    stock_prices = {sp.symbol: sp.price for sp in StockPrice.query.all()}
+    # Using the materialized positions to get Market Value in MYR
+    current_forex_rate = get_current_forex_rate()
+    stock_prices = {symbol: sp.price for symbol, sp in get_stock_prices().items()}
     
     total_portfolio_value_myr = 0
-    positions = {}
-    
-    # Quick calc loop (simplified from portfolio_overview)
-    for inv in investments:
-        if inv.symbol not in positions:
-            positions[inv.symbol] = {'quantity': 0, 'market': inv.market, 'currency': inv.currency}
-        
-        if inv.type == 'Buy': positions[inv.symbol]['quantity'] += inv.quantity
-        elif inv.type == 'Sell': positions[inv.symbol]['quantity'] -= inv.quantity
-        elif inv.type in ['Bonus', 'Split']: positions[inv.symbol]['quantity'] += inv.quantity
+    positions = positions_by_symbol(get_positions(session.get('user_id')))
             
     # Group positions by market
     market_totals = {'US': 0.0, 'MY': 0.0, 'Crypto': 0.0, 'MMF': 0.0}
@@ -1531,23 +2009,17 @@ def balance_sheet():
 
     # 3. Get Mortgages (Non-Current Liability)
     mortgages = Mortgage.query.filter_by(user_id=session.get('user_id')).all()
+    mortgage_balances = get_mortgage_balances(mortgages)
     total_mortgage_balance = 0
     mortgage_data = []
     for m in mortgages:
-        bal = calculate_mortgage_balance(m)
+        bal = mortgage_balances[m.id]
         total_mortgage_balance += bal
         mortgage_data.append({'name': m.name, 'balance': bal, 'id': m.id})
 
-    # 4. Get Manual Items and Calculate Dynamic Balances
+    # 4. Get Manual Items (dynamic balances use account_sum_map from step 1)
     manual_items = BalanceItem.query.filter_by(user_id=session.get('user_id')).all()
     
-    # Pre-fetch transaction sums per account
-    account_sums = db.session.query(
-        Transaction.account_id, func.sum(Transaction.amount)
-    ).filter(Transaction.account_id.isnot(None), Transaction.user_id == session.get('user_id')).group_by(Transaction.account_id).all()
-    account_sum_map = {acc_id: total for acc_id, total in account_sums}
-    
-    
     # Aggregation
     assets = {
         'current': [],  # Flat list for all current assets
@@ -1577,9 +2049,7 @@ def balance_sheet():
     # Categorize Manual Items
     for item in manual_items:
         # Calculate dynamic value if linked transactions exist
-        current_value = item.value
-        transaction_sum = account_sum_map.get(item.id, 0.0)
-        final_value = current_value + transaction_sum
+        final_value = get_live_balance(item, account_sum_map)
         
         entry = {'name': item.name, 'value': final_value, 'is_auto': False, 'id': item.id, 'liquidity_tier': item.liquidity_tier, 'asset_type': item.asset_type}
         
@@ -1642,24 +2112,18 @@ def balance_sheet():
 @login_required
 def cash_flow():
     # Reuse balance sheet data - get manual and auto items
-    transactions = Transaction.query.filter_by(user_id=session.get('user_id')).all()
-    total_cash_auto = sum(t.amount for t in transactions if t.account_id is None)
+    account_sum_map = get_account_balances()
+    total_cash_auto = account_sum_map.get(None, 0.0)
     
     # Get manual items with transaction sums
     manual_items = BalanceItem.query.filter_by(user_id=session.get('user_id')).all()
-    account_sums = db.session.query(
-        Transaction.account_id, func.sum(Transaction.amount)
-    ).filter(Transaction.account_id.isnot(None), Transaction.user_id == session.get('user_id')).group_by(Transaction.account_id).all()
-    account_sum_map = {acc_id: total for acc_id, total in account_sums}
     
     # Build current assets list
     current_assets = []
     current_liabilities = []
     
     for item in manual_items:
-        current_value = item.value
-        transaction_sum = account_sum_map.get(item.id, 0.0)
-        final_value = current_value + transaction_sum
+        final_value = get_live_balance(item, account_sum_map)
         
         entry = {
             'name': item.name,
@@ -1731,32 +2195,369 @@ def cash_flow():
                            grouped_liabilities=dict(grouped_liabilities))
 
 
+# --- Background Jobs ---
+# Large imports/exports can run outside the request: the route is queued with a saved
+# copy of its upload, replayed by a worker thread, and the UI polls /api/jobs/<id>.
+JOB_FOLDER = os.path.join(instance_path, 'jobs')
+JOB_RETENTION_HOURS = 24 # Finished jobs (and their files) are purged after this
+JOB_TIMEOUT_MINUTES = 60 # Queued/running jobs older than this lost their worker (e.g. a restart)
+JOB_PROGRESS_INTERVAL = 1.0 # Seconds between progress writes
+JOB_PROGRESS_ROWS = 1000 # Rows between progress checks
+job_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('JOB_WORKERS', '2')), thread_name_prefix='job')
+
+def background_job(f):
+    """
+    Lets an import/export route run as a background job. A request with background=1
+    is queued and answered with 202 and the job id; the worker later calls the route
+    with the same arguments and stores whatever it returns.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if request.values.get('background') != '1' or g.get('job_id'):
+            return f(*args, **kwargs)
+        job = enqueue_job()
+        return jsonify({'success': True, 'job_id': job.id, 'status_url': url_for('get_job', id=job.id)}), 202
+    return decorated_function
+
+def enqueue_job():
+    import uuid
+    
+    purge_old_jobs()
+    job_id = str(uuid.uuid4())
+    job_dir = os.path.join(JOB_FOLDER, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    
+    # Uploads are only valid for this request, so keep a copy for the worker
+    files = {}
+    for field, upload in request.files.items():
+        path = os.path.join(job_dir, f'upload-{field}')
+        upload.save(path)
+        files[field] = [path, upload.filename]
+    args = request.args.to_dict(flat=False)
+    form = request.form.to_dict(flat=False)
+    args.pop('background', None)
+    form.pop('background', None)
+    
+    job = BackgroundJob(
+        id=job_id,
+        user_id=session.get('user_id'),
+        kind=request.endpoint,
+        status='queued',
+        request_data=json.dumps({'path': request.path, 'method': request.method,
+                                 'args': args, 'form': form, 'files': files})
+    )
+    db.session.add(job)
+    db.session.commit()
+    job_executor.submit(run_job, job_id)
+    return job
+
+def run_job(job_id):
+    """Worker entry point: replays the queued request and records its outcome."""
+    uploads = []
+    try:
+        with app.app_context():
+            job = db.session.get(BackgroundJob, job_id)
+            spec = json.loads(job.request_data)
+            user_id = job.user_id
+            job.status = 'running'
+            db.session.commit()
+        
+        data = dict(spec['form'])
+        for field, (path, filename) in spec['files'].items():
+            uploads.append(open(path, 'rb'))
+            data[field] = (uploads[-1], filename)
+        with app.test_request_context(spec['path'], method=spec['method'], query_string=spec['args'], data=data):
+            g.job_id = job_id
+            session['user_id'] = user_id
+            outcome = save_job_result(job_id, app.full_dispatch_request())
+            outcome['session_state'] = json.dumps({key: value for key, value in session.items() if key != 'user_id'})
+    except Exception as e:
+        app.logger.exception(f"Job {job_id} failed")
+        outcome = {'status': 'failed', 'error': str(e)[:500]}
+    finally:
+        for upload in uploads:
+            upload.close()
+    
+    with app.app_context():
+        outcome['finished_at'] = datetime.utcnow()
+        BackgroundJob.query.filter_by(id=job_id).update(outcome)
+        db.session.commit()
+
+def save_job_result(job_id, response):
+    """Turns the route's response into job columns; file bodies are written to JOB_FOLDER."""
+    from werkzeug.http import parse_options_header
+    
+    if response.status_code in (301, 302, 303, 307, 308):
+        return {'status': 'done', 'redirect_to': response.location}
+    if response.status_code >= 400:
+        error = response.json.get('error') if response.is_json else None
+        return {'status': 'failed', 'error': error or f'HTTP {response.status_code}'}
+    
+    path = os.path.join(JOB_FOLDER, job_id, 'result')
+    with open(path, 'wb') as output:
+        for chunk in response.iter_encoded():
+            output.write(chunk)
+    response.close()
+    _, options = parse_options_header(response.headers.get('Content-Disposition', ''))
+    return {'status': 'done', 'result_path': path, 'result_name': options.get('filename'),
+            'result_mimetype': response.mimetype}
+
+def report_job_progress(processed):
+    """
+    Records how many rows the current job has read. Written in its own transaction (so
+    polling sees it before the import commits) and at most every JOB_PROGRESS_INTERVAL.
+    Outside a job this is a no-op.
+    """
+    import time
+    
+    job_id = g.get('job_id')
+    if not job_id:
+        return
+    now = time.monotonic()
+    if now - g.get('job_progress_at', 0) < JOB_PROGRESS_INTERVAL:
+        return
+    g.job_progress_at = now
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(update(BackgroundJob).where(BackgroundJob.id == job_id).values(processed=processed))
+    except OperationalError:
+        pass # Database busy; progress is advisory, the next report catches up
+
+def job_timeout_cutoff():
+    from datetime import timedelta
+    return datetime.utcnow() - timedelta(minutes=JOB_TIMEOUT_MINUTES)
+
+def expire_stuck_jobs():
+    """Fails queued/running jobs past JOB_TIMEOUT_MINUTES, whose worker is gone (restart, crash)."""
+    BackgroundJob.query.filter(
+        BackgroundJob.status.in_(['queued', 'running']),
+        BackgroundJob.created_at < job_timeout_cutoff()
+    ).update({'status': 'failed', 'error': 'The job did not finish in time', 'finished_at': datetime.utcnow()},
+             synchronize_session=False)
+
+def remove_job_files(job_ids):
+    import shutil
+    for job_id in job_ids:
+        shutil.rmtree(os.path.join(JOB_FOLDER, job_id), ignore_errors=True)
+
+def delete_user_jobs(user_id):
+    """Deletes a user's job rows (the caller commits) and returns their ids for remove_job_files."""
+    job_ids = [job_id for (job_id,) in db.session.query(BackgroundJob.id).filter_by(user_id=user_id)]
+    BackgroundJob.query.filter_by(user_id=user_id).delete()
+    return job_ids
+
+def purge_old_jobs():
+    from datetime import timedelta
+    
+    expire_stuck_jobs()
+    cutoff = datetime.utcnow() - timedelta(hours=JOB_RETENTION_HOURS)
+    old_jobs = BackgroundJob.query.filter(BackgroundJob.created_at < cutoff,
+                                          BackgroundJob.status.in_(['done', 'failed'])).all()
+    remove_job_files([job.id for job in old_jobs])
+    for job in old_jobs:
+        db.session.delete(job)
+    db.session.commit()
+
+@app.route('/api/jobs/<id>', methods=['GET'])
+@login_required
+def get_job(id):
+    job = BackgroundJob.query.filter_by(id=id, user_id=session.get('user_id')).first_or_404()
+    if job.status in ('queued', 'running') and job.created_at < job_timeout_cutoff():
+        expire_stuck_jobs()
+        db.session.commit()
+        db.session.refresh(job)
+    flashes = json.loads(job.session_state or '{}').get('_flashes', [])
+    return jsonify({
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'processed': job.processed or 0,
+        'error': job.error,
+        'messages': [{'category': category, 'message': message} for category, message in flashes],
+        'result_url': url_for('get_job_result', id=job.id) if job.status == 'done' else None,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    })
+
+@app.route('/jobs/<id>/result')
+@login_required
+def get_job_result(id):
+    """Hands a finished job's response to the browser: its file, page or redirect (with flashes)."""
+    from flask import send_file
+    
+    job = BackgroundJob.query.filter_by(id=id, user_id=session.get('user_id')).first_or_404()
+    if job.status != 'done':
+        return jsonify({'success': False, 'error': f'Job is {job.status}'}), 409
+    
+    # Carry over what the job put in its session (e.g. the staged import id for confirm_import)
+    state = json.loads(job.session_state or '{}')
+    for category, message in state.pop('_flashes', []):
+        flash(message, category)
+    session.update(state)
+    
+    if job.redirect_to:
+        return redirect(job.redirect_to)
+    return send_file(job.result_path, mimetype=job.result_mimetype,
+                     as_attachment=bool(job.result_name), download_name=job.result_name)
+
+# --- Export Helpers ---
+# Exports use write-only workbooks: rows are serialized to disk as they are appended,
+# and the finished file is streamed back in chunks, so memory stays flat for any size.
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+MONEY_FORMAT = '#,##0.00'
+
+def styled_cell(ws, value, font=None, fill=None, number_format=None):
+    from openpyxl.cell import WriteOnlyCell
+    cell = WriteOnlyCell(ws, value=value)
+    if font:
+        cell.font = font
+    if fill:
+        cell.fill = fill
+    if number_format:
+        cell.number_format = number_format
+    return cell
+
+def header_cells(ws, headers, fill, font):
+    return [styled_cell(ws, header, font=font, fill=fill) for header in headers]
+
+def money_cell(ws, value, font=None):
+    return styled_cell(ws, value, font=font, number_format=MONEY_FORMAT)
+
+# Export queries yield flat row tuples (attribute access by column name), never ORM objects
+EXPORT_BATCH_SIZE = 1000
+
+def export_transaction_rows(user_id):
+    """Transactions newest first, with the linked account's name joined in (None if unlinked or missing)."""
+    return db.session.query(
+        Transaction.date, Transaction.description, Transaction.category, Transaction.amount,
+        Transaction.account_id, BalanceItem.name.label('account_name')
+    ).outerjoin(BalanceItem, BalanceItem.id == Transaction.account_id).filter(
+        Transaction.user_id == user_id
+    ).order_by(Transaction.date.desc(), Transaction.id.desc()).yield_per(EXPORT_BATCH_SIZE)
+
+def export_investment_rows(user_id):
+    """Investment trades newest first."""
+    return db.session.query(
+        Investment.date, Investment.symbol, Investment.type, Investment.quantity, Investment.price,
+        Investment.fees, Investment.currency, Investment.exchange_rate, Investment.remark
+    ).filter(Investment.user_id == user_id).order_by(
+        Investment.date.desc(), Investment.id.desc()
+    ).yield_per(EXPORT_BATCH_SIZE)
+
+def export_balance_item_rows(user_id):
+    """Balance items with the columns the summaries need (works with get_live_balance)."""
+    return db.session.query(
+        BalanceItem.id, BalanceItem.classification, BalanceItem.name, BalanceItem.value,
+        BalanceItem.asset_type, BalanceItem.liquidity_tier, BalanceItem.obligation_type
+    ).filter(BalanceItem.user_id == user_id).order_by(BalanceItem.id).all()
+
+def linked_account_name(tx):
+    if not tx.account_id:
+        return 'Unlinked'
+    return tx.account_name or 'N/A'
+
+def investment_total_myr(inv):
+    if inv.type == 'Buy':
+        return ((inv.price * inv.quantity) + inv.fees) * inv.exchange_rate
+    if inv.type == 'Sell':
+        return ((inv.price * inv.quantity) - inv.fees) * inv.exchange_rate
+    return 0
+
+# Flat (CSV / Parquet) layouts: (header, kind). Headers follow the import templates,
+# so an exported file can be imported back through the same pipeline.
+TRANSACTION_EXPORT_COLUMNS = [('Date', 'date'), ('Description', 'str'), ('Category', 'str'),
+                              ('Amount (RM)', 'float'), ('Type', 'str'), ('Linked Account', 'str')]
+INVESTMENT_EXPORT_COLUMNS = [('Date', 'date'), ('Symbol', 'str'), ('Type', 'str'), ('Quantity', 'float'),
+                             ('Price', 'float'), ('Fees', 'float'), ('Currency', 'str'),
+                             ('Exchange Rate', 'float'), ('Remark', 'str'), ('Total (MYR)', 'float')]
+BALANCE_ITEM_EXPORT_COLUMNS = [('Classification', 'str'), ('Name', 'str'), ('Value', 'float'),
+                               ('Type', 'str'), ('Liquidity Tier', 'str'), ('Obligation Type', 'str')]
+EXPORT_FORMATS = ('xlsx', 'csv', 'parquet')
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+def requested_export_format():
+    fmt = request.args.get('format', 'xlsx').lower()
+    return fmt if fmt in EXPORT_FORMATS else 'xlsx'
+
+def send_flat_export(columns, rows, download_stem, fmt):
+    """
+    Sends rows as CSV (generated while the response streams) or Parquet (needs the
+    optional pyarrow package, written in batches to a temp file first).
+    """
+    from flask import Response, stream_with_context, send_file
+    import csv
+    import io
+    from itertools import islice
+    
+    download_name = f'{download_stem}.{fmt}'
+    if fmt == 'csv':
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow([header for header, _ in columns])
+            for row in rows:
+                writer.writerow(row)
+                if buffer.tell() >= EXPORT_CHUNK_SIZE:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+        response = Response(stream_with_context(generate()), mimetype='text/csv')
+        response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+        return response
+    
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return jsonify({'success': False, 'error': 'Parquet export needs the optional pyarrow package'}), 501
+    import tempfile
+    
+    types = {'date': pa.date32(), 'str': pa.string(), 'float': pa.float64()}
+    schema = pa.schema([(header, types[kind]) for header, kind in columns])
+    output = tempfile.TemporaryFile() # Removed when send_file closes it
+    writer = pq.ParquetWriter(output, schema)
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, EXPORT_BATCH_SIZE))
+        if not batch:
+            break
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+    writer.close()
+    output.seek(0)
+    return send_file(output, mimetype='application/vnd.apache.parquet', as_attachment=True, download_name=download_name)
+
+def send_workbook(wb, download_name):
+    """Saves a workbook to an anonymous temp file and streams it to the client in chunks."""
+    import tempfile
+    from flask import send_file
+    
+    output = tempfile.TemporaryFile() # Removed when send_file closes it
+    wb.save(output)
+    output.seek(0)
+    return send_file(output, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name=download_name)
+
+
 @app.route('/cash_flow/export')
 @login_required
+@background_job
 def cash_flow_export():
     from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment
-    from io import BytesIO
-    from flask import send_file
+    from openpyxl.styles import Font, PatternFill
     import datetime
     
     # Reuse cash_flow logic to get data
-    transactions = Transaction.query.all()
-    total_cash_auto = sum(t.amount for t in transactions if t.account_id is None)
+    account_sum_map = get_account_balances()
+    total_cash_auto = account_sum_map.get(None, 0.0)
     
-    manual_items = BalanceItem.query.all()
-    account_sums = db.session.query(
-        Transaction.account_id, func.sum(Transaction.amount)
-    ).filter(Transaction.account_id.isnot(None)).group_by(Transaction.account_id).all()
-    account_sum_map = {acc_id: total for acc_id, total in account_sums}
+    manual_items = export_balance_item_rows(session.get('user_id'))
     
     current_assets = []
     current_liabilities = []
     
     for item in manual_items:
-        current_value = item.value
-        transaction_sum = account_sum_map.get(item.id, 0.0)
-        final_value = current_value + transaction_sum
+        final_value = get_live_balance(item, account_sum_map)
         
         entry = {
             'name': item.name,
@@ -1804,28 +2605,24 @@ def cash_flow_export():
     expected_cash = available_cash + total_ar
     
     # Create Excel workbook
-    wb = Workbook()
+    wb = Workbook(write_only=True)
     
     # Gold and black theme colors
     gold_fill = PatternFill(start_color="D4AF37", end_color="D4AF37", fill_type="solid")
-    black_fill = PatternFill(start_color="1A1A1A", end_color="1A1A1A", fill_type="solid")
     white_font = Font(color="FFFFFF", bold=True)
     gold_font = Font(color="D4AF37", bold=True)
+    bold_font = Font(bold=True)
+    total_font = Font(bold=True, color="D4AF37")
     
     # Summary Sheet
-    ws1 = wb.active
-    ws1.title = "Cash Flow Summary"
-    
-    ws1['A1'] = "Cash Flow Overview"
-    ws1['A1'].font = Font(size=16, bold=True, color="D4AF37")
-    ws1['A2'] = f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}"
+    ws1 = wb.create_sheet("Cash Flow Summary")
+    ws1.column_dimensions['A'].width = 30
+    ws1.column_dimensions['B'].width = 20
     
-    ws1['A4'] = "Metric"
-    ws1['B4'] = "Amount (RM)"
-    ws1['A4'].fill = gold_fill
-    ws1['B4'].fill = gold_fill
-    ws1['A4'].font = white_font
-    ws1['B4'].font = white_font
+    ws1.append([styled_cell(ws1, "Cash Flow Overview", font=Font(size=16, bold=True, color="D4AF37"))])
+    ws1.append([f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}"])
+    ws1.append([])
+    ws1.append(header_cells(ws1, ["Metric", "Amount (RM)"], gold_fill, white_font))
     
     metrics = [
         ("Available Cash", available_cash),
@@ -1841,124 +2638,71 @@ def cash_flow_export():
         ("  - Standard Debt", standard_obligations)
     ]
     
-    for idx, (metric, value) in enumerate(metrics, start=5):
-        ws1[f'A{idx}'] = metric
+    for metric, value in metrics:
         if value != "":
-            ws1[f'B{idx}'] = value
-            ws1[f'B{idx}'].number_format = '#,##0.00'
-    
-    ws1.column_dimensions['A'].width = 30
-    ws1.column_dimensions['B'].width = 20
+            ws1.append([metric, money_cell(ws1, value)])
+        else:
+            ws1.append([metric])
     
     # Cash Breakdown Sheet
     ws2 = wb.create_sheet("Cash Breakdown")
-    ws2['A1'] = "Cash Breakdown"
-    ws2['A1'].font = gold_font
+    ws2.append([styled_cell(ws2, "Cash Breakdown", font=gold_font)])
+    ws2.append([])
+    ws2.append(header_cells(ws2, ["Item", "Liquidity Tier", "Amount (RM)"], gold_fill, white_font))
     
-    ws2['A3'] = "Item"
-    ws2['B3'] = "Liquidity Tier"
-    ws2['C3'] = "Amount (RM)"
-    for cell in [ws2['A3'], ws2['B3'], ws2['C3']]:
-        cell.fill = gold_fill
-        cell.font = white_font
-    
-    row = 4
     for item in grouped_current.get('Cash', {}).get('item_list', []):
-        ws2[f'A{row}'] = item['name']
-        ws2[f'B{row}'] = item.get('liquidity_tier', 'N/A')
-        ws2[f'C{row}'] = item['value']
-        ws2[f'C{row}'].number_format = '#,##0.00'
-        row += 1
-    
-    ws2[f'A{row}'] = "TOTAL"
-    ws2[f'A{row}'].font = Font(bold=True)
-    ws2[f'C{row}'] = total_cash
-    ws2[f'C{row}'].number_format = '#,##0.00'
-    ws2[f'C{row}'].font = Font(bold=True, color="D4AF37")
+        ws2.append([item['name'], item.get('liquidity_tier', 'N/A'), money_cell(ws2, item['value'])])
+    
+    ws2.append([styled_cell(ws2, "TOTAL", font=bold_font), None, money_cell(ws2, total_cash, font=total_font)])
     
     # Obligations Breakdown Sheet
     ws3 = wb.create_sheet("Obligations Breakdown")
-    ws3['A1'] = "Current Obligations"
-    ws3['A1'].font = gold_font
+    ws3.append([styled_cell(ws3, "Current Obligations", font=gold_font)])
+    ws3.append([])
+    ws3.append(header_cells(ws3, ["Type", "Item", "Amount (RM)"], gold_fill, white_font))
     
-    ws3['A3'] = "Type"
-    ws3['B3'] = "Item"
-    ws3['C3'] = "Amount (RM)"
-    for cell in [ws3['A3'], ws3['B3'], ws3['C3']]:
-        cell.fill = gold_fill
-        cell.font = white_font
-    
-    row = 4
     for obligation_type, group_data in grouped_liabilities.items():
-        ws3[f'A{row}'] = obligation_type
-        ws3[f'A{row}'].font = Font(bold=True)
-        ws3[f'C{row}'] = group_data['total']
-        ws3[f'C{row}'].number_format = '#,##0.00'
-        ws3[f'C{row}'].font = Font(bold=True)
-        row += 1
-        
+        ws3.append([styled_cell(ws3, obligation_type, font=bold_font), None, money_cell(ws3, group_data['total'], font=bold_font)])
         for item in group_data['item_list']:
-            ws3[f'B{row}'] = item['name']
-            ws3[f'C{row}'] = item['value']
-            ws3[f'C{row}'].number_format = '#,##0.00'
-            row += 1
-        row += 1
+            ws3.append([None, item['name'], money_cell(ws3, item['value'])])
+        ws3.append([])
     
     # AR Breakdown Sheet
     ws4 = wb.create_sheet("Accounts Receivable")
-    ws4['A1'] = "Accounts Receivable"
-    ws4['A1'].font = gold_font
+    ws4.append([styled_cell(ws4, "Accounts Receivable", font=gold_font)])
+    ws4.append([])
+    ws4.append(header_cells(ws4, ["Item", "Liquidity Tier", "Amount (RM)"], gold_fill, white_font))
     
-    ws4['A3'] = "Item"
-    ws4['B3'] = "Liquidity Tier"
-    ws4['C3'] = "Amount (RM)"
-    for cell in [ws4['A3'], ws4['B3'], ws4['C3']]:
-        cell.fill = gold_fill
-        cell.font = white_font
-    
-    row = 4
     for item in grouped_current.get('AR', {}).get('item_list', []):
-        ws4[f'A{row}'] = item['name']
-        ws4[f'B{row}'] = item.get('liquidity_tier', 'N/A')
-        ws4[f'C{row}'] = item['value']
-        ws4[f'C{row}'].number_format = '#,##0.00'
-        row += 1
-    
-    ws4[f'A{row}'] = "TOTAL"
-    ws4[f'A{row}'].font = Font(bold=True)
-    ws4[f'C{row}'] = total_ar
-    ws4[f'C{row}'].number_format = '#,##0.00'
-    ws4[f'C{row}'].font = Font(bold=True, color="D4AF37")
-    
-    # Save to BytesIO
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
+        ws4.append([item['name'], item.get('liquidity_tier', 'N/A'), money_cell(ws4, item['value'])])
     
-    return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=f'cash_flow_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    )
+    ws4.append([styled_cell(ws4, "TOTAL", font=bold_font), None, money_cell(ws4, total_ar, font=total_font)])
+    
+    return send_workbook(wb, f'cash_flow_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
 
 
 @app.route('/export_transactions')
 @login_required
+@background_job
 def export_transactions():
     from openpyxl import Workbook
     from openpyxl.styles import Font, PatternFill
-    from io import BytesIO
-    from flask import send_file
     import datetime
     
-    # Get all transactions
-    transactions = Transaction.query.filter_by(user_id=session.get('user_id')).order_by(Transaction.date.desc()).all()
+    # Get all transactions (streamed from the database in batches, account names joined in)
+    transactions = export_transaction_rows(session.get('user_id'))
+    
+    fmt = requested_export_format()
+    if fmt != 'xlsx':
+        return send_flat_export(TRANSACTION_EXPORT_COLUMNS, (
+            (tx.date, tx.description, tx.category or 'Uncategorized', tx.amount,
+             'Income' if tx.amount > 0 else 'Expense', linked_account_name(tx))
+            for tx in transactions
+        ), f'transactions_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}', fmt)
     
     # Create workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Transactions"
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Transactions")
     
     # Styling
     gold_fill = PatternFill(start_color="D4AF37", end_color="D4AF37", fill_type="solid")
@@ -1966,76 +2710,57 @@ def export_transactions():
     gold_font = Font(color="D4AF37", bold=True)
     
     # Header
-    ws['A1'] = "Transaction List"
-    ws['A1'].font = gold_font
-    ws['A2'] = f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}"
+    ws.append([styled_cell(ws, "Transaction List", font=gold_font)])
+    ws.append([f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}"])
+    ws.append([])
     
     # Column headers
     headers = ['Date', 'Description', 'Category', 'Amount (RM)', 'Type', 'Linked Account']
-    for idx, header in enumerate(headers, start=1):
-        cell = ws.cell(row=4, column=idx)
-        cell.value = header
-        cell.fill = gold_fill
-        cell.font = white_font
+    ws.append(header_cells(ws, headers, gold_fill, white_font))
     
     # Data rows
-    row = 5
     for tx in transactions:
-        ws[f'A{row}'] = tx.date.strftime('%Y-%m-%d')
-        ws[f'B{row}'] = tx.description
-        ws[f'C{row}'] = tx.category or 'Uncategorized'
-        ws[f'D{row}'] = tx.amount
-        ws[f'D{row}'].number_format = '#,##0.00'
-        ws[f'E{row}'] = 'Income' if tx.amount > 0 else 'Expense'
-        
-        # Get linked account name
-        if tx.account_id:
-            account = BalanceItem.query.get(tx.account_id)
-            ws[f'F{row}'] = account.name if account else 'N/A'
-        else:
-            ws[f'F{row}'] = 'Unlinked'
-        row += 1
+        ws.append([
+            tx.date.strftime('%Y-%m-%d'),
+            tx.description,
+            tx.category or 'Uncategorized',
+            money_cell(ws, tx.amount),
+            'Income' if tx.amount > 0 else 'Expense',
+            linked_account_name(tx)
+        ])
     
-    # Save
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=f'transactions_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    )
+    return send_workbook(wb, f'transactions_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
 
 
 @app.route('/balance_sheet/export')
 @login_required
+@background_job
 def balance_sheet_export():
     from openpyxl import Workbook
     from openpyxl.styles import Font, PatternFill
-    from io import BytesIO
-    from flask import send_file
     import datetime
     
     # Get balance sheet data (reuse logic from balance_sheet route)
-    transactions = Transaction.query.all()
-    total_cash_auto = sum(t.amount for t in transactions if t.account_id is None)
+    account_sum_map = get_account_balances()
+    total_cash_auto = account_sum_map.get(None, 0.0)
+    
+    manual_items = export_balance_item_rows(session.get('user_id'))
     
-    manual_items = BalanceItem.query.all()
-    account_sums = db.session.query(
-        Transaction.account_id, func.sum(Transaction.amount)
-    ).filter(Transaction.account_id.isnot(None)).group_by(Transaction.account_id).all()
-    account_sum_map = {acc_id: total for acc_id, total in account_sums}
+    fmt = requested_export_format()
+    if fmt != 'xlsx':
+        # Flat item list with live values (Unallocated Cash is derived, so it is left out)
+        return send_flat_export(BALANCE_ITEM_EXPORT_COLUMNS, [
+            (item.classification, item.name, get_live_balance(item, account_sum_map),
+             item.asset_type, item.liquidity_tier, item.obligation_type)
+            for item in manual_items
+        ], f'balance_sheet_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}', fmt)
     
     # Build assets and liabilities
     assets = {'current': [], 'non_current': []}
     liabilities = {'current': [], 'non_current': []}
     
     for item in manual_items:
-        current_value = item.value
-        transaction_sum = account_sum_map.get(item.id, 0.0)
-        final_value = current_value + transaction_sum
+        final_value = get_live_balance(item, account_sum_map)
         
         entry = {'name': item.name, 'value': final_value, 'type': item.asset_type or 'Other'}
         
@@ -2060,26 +2785,18 @@ def balance_sheet_export():
     net_worth = total_assets - total_liabilities
     
     # Create workbook
-    wb = Workbook()
+    wb = Workbook(write_only=True)
     
     gold_fill = PatternFill(start_color="D4AF37", end_color="D4AF37", fill_type="solid")
     white_font = Font(color="FFFFFF", bold=True)
     gold_font = Font(color="D4AF37", bold=True)
     
     # Summary sheet
-    ws1 = wb.active
-    ws1.title = "Summary"
-    
-    ws1['A1'] = "Balance Sheet Summary"
-    ws1['A1'].font = Font(size=16, bold=True, color="D4AF37")
-    ws1['A2'] = f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}"
-    
-    ws1['A4'] = "Metric"
-    ws1['B4'] = "Amount (RM)"
-    ws1['A4'].fill = gold_fill
-    ws1['B4'].fill = gold_fill
-    ws1['A4'].font = white_font
-    ws1['B4'].font = white_font
+    ws1 = wb.create_sheet("Summary")
+    ws1.append([styled_cell(ws1, "Balance Sheet Summary", font=Font(size=16, bold=True, color="D4AF37"))])
+    ws1.append([f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}"])
+    ws1.append([])
+    ws1.append(header_cells(ws1, ["Metric", "Amount (RM)"], gold_fill, white_font))
     
     summary_data = [
         ("Total Assets", total_assets),
@@ -2093,166 +2810,93 @@ def balance_sheet_export():
         ("Net Worth", net_worth)
     ]
     
-    for idx, (metric, value) in enumerate(summary_data, start=5):
-        ws1[f'A{idx}'] = metric
+    for metric, value in summary_data:
         if value != "":
-            ws1[f'B{idx}'] = value
-            ws1[f'B{idx}'].number_format = '#,##0.00'
-            if metric == "Net Worth":
-                ws1[f'B{idx}'].font = Font(bold=True, color="D4AF37")
+            font = Font(bold=True, color="D4AF37") if metric == "Net Worth" else None
+            ws1.append([metric, money_cell(ws1, value, font=font)])
+        else:
+            ws1.append([metric])
     
     # Assets sheet
     ws2 = wb.create_sheet("Assets")
-    ws2['A1'] = "Assets Breakdown"
-    ws2['A1'].font = gold_font
-    
-    ws2['A3'] = "Classification"
-    ws2['B3'] = "Item"
-    ws2['C3'] = "Type"
-    ws2['D3'] = "Amount (RM)"
-    for cell in [ws2['A3'], ws2['B3'], ws2['C3'], ws2['D3']]:
-        cell.fill = gold_fill
-        cell.font = white_font
+    ws2.append([styled_cell(ws2, "Assets Breakdown", font=gold_font)])
+    ws2.append([])
+    ws2.append(header_cells(ws2, ["Classification", "Item", "Type", "Amount (RM)"], gold_fill, white_font))
     
-    row = 4
     for item in assets['current']:
-        ws2[f'A{row}'] = "Current"
-        ws2[f'B{row}'] = item['name']
-        ws2[f'C{row}'] = item['type']
-        ws2[f'D{row}'] = item['value']
-        ws2[f'D{row}'].number_format = '#,##0.00'
-        row += 1
+        ws2.append(["Current", item['name'], item['type'], money_cell(ws2, item['value'])])
     
     if total_cash_auto > 0:
-        ws2[f'A{row}'] = "Current"
-        ws2[f'B{row}'] = "Unallocated Cash"
-        ws2[f'C{row}'] = "Cash"
-        ws2[f'D{row}'] = total_cash_auto
-        ws2[f'D{row}'].number_format = '#,##0.00'
-        row += 1
+        ws2.append(["Current", "Unallocated Cash", "Cash", money_cell(ws2, total_cash_auto)])
     
     for item in assets['non_current']:
-        ws2[f'A{row}'] = "Non-Current"
-        ws2[f'B{row}'] = item['name']
-        ws2[f'C{row}'] = item['type']
-        ws2[f'D{row}'] = item['value']
-        ws2[f'D{row}'].number_format = '#,##0.00'
-        row += 1
+        ws2.append(["Non-Current", item['name'], item['type'], money_cell(ws2, item['value'])])
     
     # Liabilities sheet
     ws3 = wb.create_sheet("Liabilities")
-    ws3['A1'] = "Liabilities Breakdown"
-    ws3['A1'].font = gold_font
-    
-    ws3['A3'] = "Classification"
-    ws3['B3'] = "Item"
-    ws3['C3'] = "Type"
-    ws3['D3'] = "Amount (RM)"
-    for cell in [ws3['A3'], ws3['B3'], ws3['C3'], ws3['D3']]:
-        cell.fill = gold_fill
-        cell.font = white_font
+    ws3.append([styled_cell(ws3, "Liabilities Breakdown", font=gold_font)])
+    ws3.append([])
+    ws3.append(header_cells(ws3, ["Classification", "Item", "Type", "Amount (RM)"], gold_fill, white_font))
     
-    row = 4
     for item in liabilities['current']:
-        ws3[f'A{row}'] = "Current"
-        ws3[f'B{row}'] = item['name']
-        ws3[f'C{row}'] = item['type']
-        ws3[f'D{row}'] = item['value']
-        ws3[f'D{row}'].number_format = '#,##0.00'
-        row += 1
+        ws3.append(["Current", item['name'], item['type'], money_cell(ws3, item['value'])])
     
     for item in liabilities['non_current']:
-        ws3[f'A{row}'] = "Non-Current"
-        ws3[f'B{row}'] = item['name']
-        ws3[f'C{row}'] = item['type']
-        ws3[f'D{row}'] = item['value']
-        ws3[f'D{row}'].number_format = '#,##0.00'
-        row += 1
-    
-    # Save
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
+        ws3.append(["Non-Current", item['name'], item['type'], money_cell(ws3, item['value'])])
     
-    return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=f'balance_sheet_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    )
+    return send_workbook(wb, f'balance_sheet_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
 
 
 @app.route('/portfolio/export')
 @login_required
+@background_job
 def portfolio_export():
     from openpyxl import Workbook
     from openpyxl.styles import Font, PatternFill
-    from io import BytesIO
-    from flask import send_file
     import datetime
     
-    investments = Investment.query.filter_by(user_id=session.get('user_id')).order_by(Investment.date.desc()).all()
+    investments = export_investment_rows(session.get('user_id'))
+    
+    fmt = requested_export_format()
+    if fmt != 'xlsx':
+        return send_flat_export(INVESTMENT_EXPORT_COLUMNS, (
+            (inv.date, inv.symbol, inv.type, inv.quantity, inv.price, inv.fees, inv.currency,
+             inv.exchange_rate, inv.remark or '', investment_total_myr(inv))
+            for inv in investments
+        ), f'portfolio_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}', fmt)
     
     # Create workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Investment Portfolio"
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Investment Portfolio")
     
     gold_fill = PatternFill(start_color="D4AF37", end_color="D4AF37", fill_type="solid")
     white_font = Font(color="FFFFFF", bold=True)
     gold_font = Font(color="D4AF37", bold=True)
     
-    ws['A1'] = "Investment Portfolio"
-    ws['A1'].font = gold_font
-    ws['A2'] = f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}"
+    ws.append([styled_cell(ws, "Investment Portfolio", font=gold_font)])
+    ws.append([f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}"])
+    ws.append([])
     
     # Headers
     headers = ['Date', 'Symbol', 'Type', 'Quantity', 'Price', 'Fees', 'Currency', 'Exchange Rate', 'Total (MYR)', 'Remark']
-    for idx, header in enumerate(headers, start=1):
-        cell = ws.cell(row=4, column=idx)
-        cell.value = header
-        cell.fill = gold_fill
-        cell.font = white_font
+    ws.append(header_cells(ws, headers, gold_fill, white_font))
     
     # Data
-    row = 5
     for inv in investments:
-        ws[f'A{row}'] = inv.date.strftime('%Y-%m-%d')
-        ws[f'B{row}'] = inv.symbol
-        ws[f'C{row}'] = inv.type
-        ws[f'D{row}'] = inv.quantity
-        ws[f'E{row}'] = inv.price
-        ws[f'E{row}'].number_format = '#,##0.00'
-        ws[f'F{row}'] = inv.fees
-        ws[f'F{row}'].number_format = '#,##0.00'
-        ws[f'G{row}'] = inv.currency
-        ws[f'H{row}'] = inv.exchange_rate
-        ws[f'H{row}'].number_format = '#,##0.0000'
-        
-        # Calculate total in MYR
-        if inv.type == 'Buy':
-            total_myr = ((inv.price * inv.quantity) + inv.fees) * inv.exchange_rate
-        elif inv.type == 'Sell':
-            total_myr = ((inv.price * inv.quantity) - inv.fees) * inv.exchange_rate
-        else:
-            total_myr = 0
-        
-        ws[f'I{row}'] = total_myr
-        ws[f'I{row}'].number_format = '#,##0.00'
-        ws[f'J{row}'] = inv.remark or ''
-        row += 1
-    
-    # Save
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=f'portfolio_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    )
+        ws.append([
+            inv.date.strftime('%Y-%m-%d'),
+            inv.symbol,
+            inv.type,
+            inv.quantity,
+            money_cell(ws, inv.price),
+            money_cell(ws, inv.fees),
+            inv.currency,
+            styled_cell(ws, inv.exchange_rate, number_format='#,##0.0000'),
+            money_cell(ws, investment_total_myr(inv)),
+            inv.remark or ''
+        ])
+    
+    return send_workbook(wb, f'portfolio_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
 
 
 # ===== EXCEL IMPORT FUNCTIONALITY =====
@@ -2309,12 +2953,146 @@ def download_transaction_template():
     )
 
 
+# --- Import Helpers ---
+IMPORT_HEADER_SEARCH_ROWS = 9 # Header must be within the first rows of the sheet
+IMPORT_BATCH_SIZE = 5000 # Rows per executemany batch
+
+def bulk_insert(model, rows):
+    """
+    Inserts a list of column dicts with executemany in batches, bypassing the ORM
+    unit of work (no per-row objects or identity map). The caller commits, so the
+    whole import still lands in one transaction.
+    """
+    for start in range(0, len(rows), IMPORT_BATCH_SIZE):
+        db.session.execute(insert(model), rows[start:start + IMPORT_BATCH_SIZE])
+
+IMPORT_FORMATS = ('.xlsx', '.csv', '.parquet')
+
+def import_file_format(filename):
+    """Lower-case extension of an upload if it is a supported import format, else None."""
+    ext = os.path.splitext(filename or '')[1].lower()
+    return ext if ext in IMPORT_FORMATS else None
+
+def _xlsx_source(file):
+    # openpyxl read-only mode: cells are parsed lazily, the workbook DOM is never built
+    from openpyxl import load_workbook
+    wb = load_workbook(file, read_only=True)
+    ws = wb.active
+    ws.reset_dimensions() # Don't trust the stored sheet size; read until the last row
+    return ws.iter_rows(values_only=True), wb.close
+
+def _csv_source(file):
+    import csv
+    import codecs
+    lines = codecs.iterdecode(file.stream, 'utf-8-sig')
+    # Empty CSV fields mean "no value", like empty Excel cells
+    rows = (tuple(value if value != '' else None for value in values) for values in csv.reader(lines))
+    return rows, None
+
+def _parquet_source(file):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError('Parquet files need the optional pyarrow package')
+    parquet_file = pq.ParquetFile(file.stream)
+    
+    def rows():
+        yield tuple(parquet_file.schema_arrow.names) # Column names act as the header row
+        for batch in parquet_file.iter_batches(batch_size=IMPORT_BATCH_SIZE):
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+    return rows(), getattr(parquet_file, 'close', None)
+
+IMPORT_SOURCES = {'.xlsx': _xlsx_source, '.csv': _csv_source, '.parquet': _parquet_source}
+
+def read_import_rows(file, header_values, width, label='rows'):
+    """
+    Streams an uploaded .xlsx, .csv or .parquet file row by row, so every format shares
+    the same validation and duplicate checks downstream.
+    Locates the header row (first cell in header_values) and returns a generator of
+    (row_number, values) for the rows below it, with values padded/trimmed to width,
+    or None if no header was found. Memory stays flat regardless of file size, and
+    parse throughput is logged once the generator is exhausted.
+    """
+    import time
+    
+    fmt = import_file_format(file.filename)
+    rows, close = IMPORT_SOURCES[fmt](file)
+    
+    header_row = None
+    for row_idx, values in enumerate(rows, start=1):
+        if values and values[0] in header_values:
+            header_row = row_idx
+            break
+        if row_idx >= IMPORT_HEADER_SEARCH_ROWS:
+            break
+    if header_row is None:
+        if close:
+            close()
+        return None
+    
+    def data_rows():
+        started = time.perf_counter()
+        count = 0
+        try:
+            for row_idx, values in enumerate(rows, start=header_row + 1):
+                count += 1
+                if count % JOB_PROGRESS_ROWS == 0:
+                    report_job_progress(count)
+                values = tuple(values[:width])
+                yield row_idx, values + (None,) * (width - len(values))
+        finally:
+            if close:
+                close()
+            elapsed = time.perf_counter() - started
+            app.logger.info(f"Import {label} ({fmt}): processed {count} rows in {elapsed:.2f}s "
+                            f"({count / elapsed if elapsed else 0:.0f} rows/s)")
+    return data_rows()
+
+def get_existing_transaction_keys(user_id, dates):
+    """
+    (date, description, amount) keys of the user's transactions between min(dates) and
+    max(dates). The range scan uses ix_transaction_user_date, so the cost follows the
+    imported file rather than the account's whole history.
+    """
+    if not dates:
+        return set()
+    rows = db.session.query(Transaction.date, Transaction.description, Transaction.amount).filter(
+        Transaction.user_id == user_id,
+        Transaction.date >= min(dates),
+        Transaction.date <= max(dates)
+    )
+    return {(tx_date, description.strip(), amount) for tx_date, description, amount in rows}
+
+def get_existing_investment_keys(user_id, trades):
+    """
+    (date, symbol, type, quantity, price) keys of the user's investments that could match
+    the parsed trades: one query bounded by the file's date span and symbols.
+    """
+    if not trades:
+        return set()
+    dates = [trade['date'] for trade in trades]
+    return set(db.session.query(
+        Investment.date, Investment.symbol, Investment.type, Investment.quantity, Investment.price
+    ).filter(
+        Investment.user_id == user_id,
+        Investment.date >= min(dates),
+        Investment.date <= max(dates),
+        Investment.symbol.in_({trade['symbol'] for trade in trades})
+    ).all())
+
+def parse_import_date(value):
+    # Excel dates arrive as datetime/date, anything else must be YYYY-MM-DD
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date_type):
+        return value
+    return datetime.strptime(str(value), '%Y-%m-%d').date()
+
 @app.route('/import_transactions', methods=['POST'])
 @login_required
+@background_job
 def import_transactions():
-    from openpyxl import load_workbook
     from flask import request, flash, redirect, url_for, session, render_template
-    import datetime as dt
     
     if 'file' not in request.files:
         flash('No file uploaded', 'danger')
@@ -2325,43 +3103,23 @@ def import_transactions():
         flash('No file selected', 'danger')
         return redirect(url_for('index'))
     
-    if not file.filename.endswith('.xlsx'):
-        flash('Please upload an Excel file (.xlsx)', 'danger')
+    if not import_file_format(file.filename):
+        flash('Please upload an Excel (.xlsx), CSV or Parquet file', 'danger')
         return redirect(url_for('index'))
     
     try:
-        wb = load_workbook(file)
-        ws = wb.active
+        rows = read_import_rows(file, ['Date', 'date', 'DATE'], 4, label='transactions')
+        if rows is None:
+            flash('Could not find header row with "Date" column', 'danger')
+            return redirect(url_for('index'))
         
         staged_data = [] # List of dicts
-        duplicates = []
-        new_items = []
+        db_candidates = [] # (item, db_key) for rows that still need the database check
         seen_in_file = set() # Track (date, description, amount) to find duplicates within the file itself
         
-        # OPTIMIZATION: Load all existing transactions once (instead of querying per row)
-        existing_transactions = Transaction.query.filter_by(user_id=session.get('user_id')).all()
-        existing_keys = {(t.date, t.description.strip(), t.amount) for t in existing_transactions}
-        
-        # Find header row (look for "Date" column)
-        header_row = None
-        for row_idx in range(1, 10):
-            if ws.cell(row=row_idx, column=1).value in ['Date', 'date', 'DATE']:
-                header_row = row_idx
-                break
-        
-        if header_row is None:
-            flash('Could not find header row with "Date" column', 'danger')
-            return redirect(url_for('index'))
-        
         # Parse rows
-        idx_counter = 0
-        for row_idx in range(header_row + 1, ws.max_row + 1):
+        for row_idx, (date_val, description_raw, category_raw, amount) in rows:
             try:
-                date_val = ws.cell(row=row_idx, column=1).value
-                description_raw = ws.cell(row=row_idx, column=2).value
-                category_raw = ws.cell(row=row_idx, column=3).value
-                amount = ws.cell(row=row_idx, column=4).value
-                
                 # Skip empty rows
                 if not date_val or not description_raw or amount is None:
                     continue
@@ -2371,75 +3129,70 @@ def import_transactions():
                 category = str(category_raw).strip() if category_raw else 'Uncategorized'
                 
                 # Parse date
-                if isinstance(date_val, dt.datetime):
-                    date_obj = date_val.date()
-                elif isinstance(date_val, dt.date):
-                    date_obj = date_val
-                else:
-                    date_obj = dt.datetime.strptime(str(date_val), '%Y-%m-%d').date()
+                date_obj = parse_import_date(date_val)
                 
                 # Convert amount to float
                 amount_float = float(amount)
                 
-                duplicate_reason = None
-                is_duplicate = False
-                
-                # 1. Check for In-File Duplicate
-                unique_key = (date_obj, description.lower(), amount_float) # normalized key
-                if unique_key in seen_in_file:
-                    is_duplicate = True
-                    duplicate_reason = "Duplicate row in file"
-                else:
-                    seen_in_file.add(unique_key)
-                    
-                    # 2. Check for Database Duplicate (using pre-loaded set - FAST!)
-                    db_key = (date_obj, description, amount_float)
-                    if db_key in existing_keys:
-                        is_duplicate = True
-                        duplicate_reason = "Already exists in DB"
-
                 item = {
-                    'index': idx_counter,
                     'date': date_obj.strftime('%Y-%m-%d'), # Store as string for session
                     'description': description,
                     'category': category,
                     'amount': amount_float,
-                    'is_possible_duplicate': is_duplicate,
-                    'duplicate_reason': duplicate_reason
+                    'is_possible_duplicate': False,
+                    'duplicate_reason': None
                 }
                 
-                staged_data.append(item)
-                
-                if is_duplicate:
-                    duplicates.append(item)
+                # 1. Check for In-File Duplicate
+                unique_key = (date_obj, description.lower(), amount_float) # normalized key
+                if unique_key in seen_in_file:
+                    item['is_possible_duplicate'] = True
+                    item['duplicate_reason'] = "Duplicate row in file"
                 else:
-                    new_items.append(item)
-                    
-                idx_counter += 1
+                    seen_in_file.add(unique_key)
+                    db_candidates.append((item, (date_obj, description, amount_float)))
+                
+                staged_data.append(item)
                 
             except Exception as e:
                 pass # Skip bad rows for preview
+        
+        # 2. Check for Database Duplicates, fetching only the file's date range
+        existing_keys = get_existing_transaction_keys(session.get('user_id'), [db_key[0] for _, db_key in db_candidates])
+        for item, db_key in db_candidates:
+            if db_key in existing_keys:
+                item['is_possible_duplicate'] = True
+                item['duplicate_reason'] = "Already exists in DB"
+        
+        duplicates = [item for item in staged_data if item['is_possible_duplicate']]
+        new_items = [item for item in staged_data if not item['is_possible_duplicate']]
                 
         # Clear old staging data for this user  
-        StagedImport.query.filter_by(user_id=session.get('user_id')).delete()
+        StagedImport.query.filter_by(user_id=session.get('user_id')).delete(synchronize_session=False)
         
         # Store import data in database instead of session (avoids 4KB cookie limit!)
         import uuid
         import_session_id = str(uuid.uuid4())
         session['import_session_id'] = import_session_id
         
-        for item in staged_data:
-            staged_row = StagedImport(
-                user_id=session.get('user_id'),
-                session_id=import_session_id,
-                date=datetime.strptime(item['date'], '%Y-%m-%d').date(),
-                description=item['description'],
-                category=item['category'],
-                amount=item['amount'],
-                is_duplicate=item['is_possible_duplicate'],
-                duplicate_reason=item['duplicate_reason']
-            )
-            db.session.add(staged_row)
+        staged_at = datetime.utcnow()
+        bulk_insert(StagedImport, [{
+            'user_id': session.get('user_id'),
+            'session_id': import_session_id,
+            'date': datetime.strptime(item['date'], '%Y-%m-%d').date(),
+            'description': item['description'],
+            'category': item['category'],
+            'amount': item['amount'],
+            'is_duplicate': item['is_possible_duplicate'],
+            'duplicate_reason': item['duplicate_reason'],
+            'file_row': file_row,
+            'created_at': staged_at
+        } for file_row, item in enumerate(staged_data)])
+        
+        # Tag each preview row with its staged id; the review form posts these ids back
+        staged_ids = db.session.query(StagedImport.file_row, StagedImport.id).filter_by(session_id=import_session_id)
+        for file_row, staged_id in staged_ids:
+            staged_data[file_row]['id'] = staged_id
         
         db.session.commit()
         
@@ -2492,91 +3245,88 @@ def confirm_import():
         flash('Import session expired. Please upload file again.', 'warning')
         return redirect(url_for('index'))
     
-    # Get all staged items for this import session
-    staged_items = StagedImport.query.filter_by(
+    # Get all staged items for this import session (plain rows, no ORM objects)
+    staged_items = db.session.query(
+        StagedImport.id, StagedImport.date, StagedImport.description,
+        StagedImport.category, StagedImport.amount
+    ).filter_by(
         user_id=session.get('user_id'),
         session_id=import_session_id
-    ).all()
+    ).order_by(StagedImport.id).all()
     
     if not staged_items:
         flash('No staged import data found.', 'warning')
         return redirect(url_for('index'))
     
-    # Get selected indices from form checkboxes
-    selected_ids = request.form.getlist('import_indices')
-    selected_ids = [int(idx) for idx in selected_ids]
+    # Selected rows arrive as stable staged-row ids (not positions), so gaps in ids don't matter
+    selected_ids = {int(staged_id) for staged_id in request.form.getlist('import_ids') if staged_id.isdigit()}
     
     # Get auto-create setting
     auto_create = request.form.get('auto_create_categories') == '1'
     
     # Pre-fetch existing categories to avoid duplicates
-    # Pre-fetch existing categories to avoid duplicates
-    existing_cats = CustomCategory.query.filter_by(user_id=session.get('user_id')).all()
-    existing_map = {c.name.lower(): c for c in existing_cats}
-    existing_cat_names = set(c.name for c in existing_cats)
-    created_in_session = set() # Track new categories creating in this batch
+    existing_cat_names = {name for (name,) in db.session.query(CustomCategory.name).filter_by(user_id=session.get('user_id'))}
+    
+    def resolve_category(category):
+        """Final category for a file category (V2.3 mapping), or None to skip its rows."""
+        mapping_choice = request.form.get(f"map_{category}")
+        
+        # If user mapped to an existing category
+        if mapping_choice and not mapping_choice.startswith('__NEW_'):
+            return mapping_choice
+        
+        # If creating new category
+        if category not in existing_cat_names:
+            if not auto_create:
+                return None # Skip if auto-create is OFF
+            
+            # Determine Type
+            cat_type = 'Expense' # Default
+            if mapping_choice == '__NEW_INCOME__':
+                cat_type = 'Income'
+            elif mapping_choice == '__NEW_SAVINGS__':
+                cat_type = 'Savings'
+            
+            # Create new Custom Category
+            db.session.add(CustomCategory(
+                user_id=session.get('user_id'),
+                name=category,
+                category_type=cat_type,
+                is_custom=True
+            ))
+        return category
 
-    # Import selected transactions
+    # Import selected transactions (mapping resolved once per distinct category)
     imported_count = 0
     skipped_count = 0
+    new_transactions = []
+    category_targets = {}
     
     for staged in staged_items:
-        # Match by index (staged.id - first_id = index)
-        first_id = staged_items[0].id
-        item_index = staged.id - first_id
-        
-        if item_index in selected_ids:
-            
-            # --- V2.3 Mapping Logic ---
-            final_category = staged.category
-            mapping_key = f"map_{staged.category}"
-            mapping_choice = request.form.get(mapping_key)
-            
-            # If user mapped to an existing category
-            if mapping_choice and not mapping_choice.startswith('__NEW_'):
-                final_category = mapping_choice
-            
-            # If creating new category
-            else:
-                # Check if it needs to be created
-                if final_category not in existing_cat_names and final_category not in created_in_session:
-                    if auto_create:
-                        # Determine Type
-                        cat_type = 'Expense' # Default
-                        if mapping_choice == '__NEW_INCOME__':
-                            cat_type = 'Income'
-                        elif mapping_choice == '__NEW_SAVINGS__':
-                            cat_type = 'Savings'
-                        
-                        # Create new Custom Category
-                        new_cat = CustomCategory(
-                            user_id=session.get('user_id'),
-                            name=final_category,
-                            category_type=cat_type,
-                            is_custom=True
-                        )
-                        db.session.add(new_cat)
-                        created_in_session.add(final_category)
-                    else:
-                        # Skip if auto-create is OFF
-                        skipped_count += 1
-                        continue
-
-            new_transaction = Transaction(
-                date=staged.date,
-                description=staged.description,
-                category=final_category,
-                amount=staged.amount,
-                user_id=session.get('user_id')
-            )
-            db.session.add(new_transaction)
-            imported_count += 1
+        if staged.id not in selected_ids:
+            continue
+        
+        if staged.category not in category_targets:
+            category_targets[staged.category] = resolve_category(staged.category)
+        final_category = category_targets[staged.category]
+        
+        if final_category is None:
+            skipped_count += 1
+            continue
+        
+        new_transactions.append({
+            'date': staged.date,
+            'description': staged.description,
+            'category': final_category,
+            'amount': staged.amount,
+            'user_id': session.get('user_id')
+        })
+        imported_count += 1
     
-    # Commit all transactions
-    db.session.commit()
+    bulk_insert(Transaction, new_transactions)
     
-    # Clean up staging data
-    StagedImport.query.filter_by(session_id=import_session_id).delete()
+    # Clean up staging data in the same transaction
+    StagedImport.query.filter_by(session_id=import_session_id).delete(synchronize_session=False)
     db.session.commit()
     session.pop('import_session_id', None)
     
@@ -2644,8 +3394,8 @@ def download_balance_sheet_template():
 
 @app.route('/import_balance_sheet', methods=['POST'])
 @login_required
+@background_job
 def import_balance_sheet():
-    from openpyxl import load_workbook
     from flask import request, flash, redirect, url_for
     
     if 'file' not in request.files:
@@ -2653,49 +3403,31 @@ def import_balance_sheet():
         return redirect(url_for('balance_sheet'))
     
     file = request.files['file']
-    if file.filename == '' or not file.filename.endswith('.xlsx'):
-        flash('Please upload an Excel file (.xlsx)', 'danger')
+    if file.filename == '' or not import_file_format(file.filename):
+        flash('Please upload an Excel (.xlsx), CSV or Parquet file', 'danger')
         return redirect(url_for('balance_sheet'))
     
     try:
-        wb = load_workbook(file)
-        ws = wb.active
+        rows = read_import_rows(file, ['Classification', 'classification'], 6, label='balance sheet')
+        if rows is None:
+            flash('Could not find header row', 'danger')
+            return redirect(url_for('balance_sheet'))
         
         success_count = 0
         skip_count = 0
         errors = []
         
-        # Find header row
-        header_row = None
-        for row_idx in range(1, 10):
-            if ws.cell(row=row_idx, column=1).value in ['Classification', 'classification']:
-                header_row = row_idx
-                break
+        # Duplicate detection: the user's (classification, name) pairs, fetched once
+        existing_keys = set(db.session.query(BalanceItem.classification, BalanceItem.name).filter(
+            BalanceItem.user_id == session.get('user_id')
+        ).all())
         
-        if header_row is None:
-            flash('Could not find header row', 'danger')
-            return redirect(url_for('balance_sheet'))
-        
-        for row_idx in range(header_row + 1, ws.max_row + 1):
+        for row_idx, (classification, name, value, asset_type, liquidity_tier, obligation_type) in rows:
             try:
-                classification = ws.cell(row=row_idx, column=1).value
-                name = ws.cell(row=row_idx, column=2).value
-                value = ws.cell(row=row_idx, column=3).value
-                asset_type = ws.cell(row=row_idx, column=4).value
-                liquidity_tier = ws.cell(row=row_idx, column=5).value
-                obligation_type = ws.cell(row=row_idx, column=6).value
-                
                 if not classification or not name or value is None:
                     continue
                 
-                # Duplicate detection
-                existing = BalanceItem.query.filter_by(
-                    classification=classification,
-                    name=name,
-                    user_id=session.get('user_id')
-                ).first()
-                
-                if existing:
+                if (classification, name) in existing_keys:
                     skip_count += 1
                     continue
                 
@@ -2709,6 +3441,7 @@ def import_balance_sheet():
                     user_id=session.get('user_id')
                 )
                 db.session.add(item)
+                existing_keys.add((classification, name)) # Repeats later in the file are duplicates too
                 success_count += 1
                 
             except Exception as e:
@@ -2782,78 +3515,39 @@ def download_portfolio_template():
 
 @app.route('/import_portfolio', methods=['POST'])
 @login_required
+@background_job
 def import_portfolio():
-    from openpyxl import load_workbook
     from flask import request, flash, redirect, url_for
-    import datetime as dt
     
     if 'file' not in request.files:
         flash('No file uploaded', 'danger')
         return redirect(url_for('portfolio'))
     
     file = request.files['file']
-    if file.filename == '' or not file.filename.endswith('.xlsx'):
-        flash('Please upload an Excel file (.xlsx)', 'danger')
+    if file.filename == '' or not import_file_format(file.filename):
+        flash('Please upload an Excel (.xlsx), CSV or Parquet file', 'danger')
         return redirect(url_for('portfolio'))
     
     try:
-        wb = load_workbook(file)
-        ws = wb.active
+        rows = read_import_rows(file, ['Date', 'date'], 9, label='portfolio')
+        if rows is None:
+            flash('Could not find header row', 'danger')
+            return redirect(url_for('portfolio'))
         
         success_count = 0
         skip_count = 0
         errors = []
+        imported_keys = set()
         
-        # Find header
-        header_row = None
-        for row_idx in range(1, 10):
-            if ws.cell(row=row_idx, column=1).value in ['Date', 'date']:
-                header_row = row_idx
-                break
-        
-        if header_row is None:
-            flash('Could not find header row', 'danger')
-            return redirect(url_for('portfolio'))
-        
-        for row_idx in range(header_row + 1, ws.max_row + 1):
+        # Parse the whole file first so existing trades can be prefetched in one query
+        trades = []
+        for row_idx, (date_val, symbol, inv_type, quantity, price, fees, currency, exchange_rate, remark) in rows:
             try:
-                date_val = ws.cell(row=row_idx, column=1).value
-                symbol = ws.cell(row=row_idx, column=2).value
-                inv_type = ws.cell(row=row_idx, column=3).value
-                quantity = ws.cell(row=row_idx, column=4).value
-                price = ws.cell(row=row_idx, column=5).value
-                fees = ws.cell(row=row_idx, column=6).value
-                currency = ws.cell(row=row_idx, column=7).value
-                exchange_rate = ws.cell(row=row_idx, column=8).value
-                remark = ws.cell(row=row_idx, column=9).value
-                
                 if not date_val or not symbol or not inv_type:
                     continue
                 
-                # Parse date
-                if isinstance(date_val, dt.datetime):
-                    date_obj = date_val.date()
-                elif isinstance(date_val, dt.date):
-                    date_obj = date_val
-                else:
-                    date_obj = dt.datetime.strptime(str(date_val), '%Y-%m-%d').date()
-                
-                # Duplicate detection
-                existing = Investment.query.filter_by(
-                    date=date_obj,
-                    symbol=symbol,
-                    type=inv_type,
-                    quantity=float(quantity or 0),
-                    price=float(price or 0),
-                    user_id=session.get('user_id')
-                ).first()
-                
-                if existing:
-                    skip_count += 1
-                    continue
-                
-                investment = Investment(
-                    date=date_obj,
+                trades.append(dict(
+                    date=parse_import_date(date_val),
                     symbol=symbol,
                     type=inv_type,
                     quantity=float(quantity or 0),
@@ -2861,15 +3555,28 @@ def import_portfolio():
                     fees=float(fees or 0),
                     currency=currency or 'MYR',
                     exchange_rate=float(exchange_rate or 1.0),
-                    remark=remark,
-                    user_id=session.get('user_id')
-                )
-                db.session.add(investment)
-                success_count += 1
-                
+                    remark=remark
+                ))
             except Exception as e:
                 errors.append(f"Row {row_idx}: {str(e)}")
         
+        # Duplicate detection
+        existing_keys = get_existing_investment_keys(session.get('user_id'), trades)
+        
+        for trade in trades:
+            trade_key = (trade['date'], trade['symbol'], trade['type'], trade['quantity'], trade['price'])
+            if trade_key in existing_keys:
+                skip_count += 1
+                continue
+            existing_keys.add(trade_key) # Repeats later in the file are duplicates too
+            
+            investment = Investment(user_id=session.get('user_id'), **trade)
+            db.session.add(investment)
+            imported_keys.add(position_key(investment))
+            success_count += 1
+        
+        # Imported rows can be back-dated, so replay each touched position once
+        refresh_positions(imported_keys)
         db.session.commit()
         
         if success_count > 0:
@@ -2985,7 +3692,7 @@ def edit_balance_item(id):
             new_value = float(val_str)
         
         # Calculate current transaction sum for this account
-        transaction_sum = db.session.query(func.sum(Transaction.amount)).filter_by(account_id=id).scalar() or 0.0
+        transaction_sum = get_account_sum_map(session.get('user_id'), account_ids=[id]).get(id, 0.0)
         
         # The user sees: stored_value + transaction_sum
         # The user inputs new_value as the FINAL displayed value
@@ -3060,12 +3767,18 @@ def edit_balance_item(id):
 @app.route('/api/forecast')
 @login_required
 def get_forecast():
-    import datetime
-    from calendar import monthrange
-    from dateutil.relativedelta import relativedelta
-    
-    # 1. Starting Balance (Current Cash from Balance Sheet)
-    # Sum all Cash items from Balance Sheet
+    """
+    Projected cash balance from recurring items (by their real frequency) and active goals.
+    Query: months (1-120, default 6) and granularity ('monthly' month-end points or 'daily').
+    """
+    months = request.args.get('months', 6, type=int)
+    granularity = request.args.get('granularity', FORECAST_MONTHLY)
+    if not 1 <= months <= MAX_FORECAST_MONTHS:
+        return jsonify({'success': False, 'error': f'months must be between 1 and {MAX_FORECAST_MONTHS}'}), 400
+    if granularity not in (FORECAST_DAILY, FORECAST_MONTHLY):
+        return jsonify({'success': False, 'error': "granularity must be 'daily' or 'monthly'"}), 400
+    
+    # Starting Balance (Current Cash from Balance Sheet)
     current_balance = db.session.query(func.sum(BalanceItem.value))\
         .filter_by(user_id=session.get('user_id'), asset_type='Cash')\
         .scalar() or 0.0
@@ -3073,45 +3786,14 @@ def get_forecast():
     recurring = BudgetRecurring.query.filter_by(user_id=session.get('user_id')).all()
     goals = BudgetGoal.query.filter_by(user_id=session.get('user_id'), is_active=True).all()
     
-    labels = []
-    values = []
-    
-    # 2. Project next 6 months
-    today = datetime.date.today()
-    running_balance = current_balance
-    
-    # Add "Current" point
-    labels.append("Now")
-    values.append(round(running_balance, 2))
-    
-    for i in range(1, 7):
-        next_month = today + relativedelta(months=i)
-        month_name = next_month.strftime('%b %Y')
-        
-        # Monthly Net Change from Recurring
-        monthly_change = 0
-        for item in recurring:
-            # Simple logic for now: Assume all recurring items happen once a month
-            # (Improve later for Weekly/Yearly)
-            if item.frequency == 'Monthly':
-                if item.type == 'Income':
-                    monthly_change += item.amount
-                else:
-                    monthly_change -= item.amount
-        
-        # Adjust for Goals falling in this month
-        goals_cost = 0
-        for goal in goals:
-            # Check if goal target is in this month/year
-            if goal.target_date.year == next_month.year and goal.target_date.month == next_month.month:
-                goals_cost += goal.target_amount
-                
-        running_balance += monthly_change - goals_cost
+    label_format = '%Y-%m-%d' if granularity == FORECAST_DAILY else '%b %Y'
+    labels = ['Now']
+    values = [round(current_balance, 2)]
+    for point, balance in forecast(current_balance, recurring, goals, datetime.utcnow().date(), months, granularity):
+        labels.append(point.strftime(label_format))
+        values.append(round(balance, 2))
         
-        labels.append(month_name)
-        values.append(round(running_balance, 2))
-        
-    return jsonify({'labels': labels, 'values': values})
+    return jsonify({'labels': labels, 'values': values, 'granularity': granularity})
 
 @app.route('/balance_sheet/transactions/<int:id>')
 @login_required
@@ -3176,6 +3858,7 @@ def add_mortgage():
         user_id=session.get('user_id')
     )
     db.session.add(rate_event)
+    refresh_mortgage_ledger(new_mortgage, start_date) # Seed the yearly checkpoints up to today
     db.session.commit()
     
     return redirect(url_for('balance_sheet'))
@@ -3186,68 +3869,14 @@ def portfolio_overview():
     filter_type = request.args.get('filter', 'overall')
     view_currency = request.args.get('currency', 'MYR')  # MYR, USD, or Original
     
-    investments = Investment.query.order_by(Investment.date).all()
     avg_forex_rate = get_average_forex_rate()
-    stock_prices = {sp.symbol: sp.price for sp in StockPrice.query.all()}
+    stock_prices = {symbol: sp.price for symbol, sp in get_stock_prices().items()}
     
     # Get current USD/MYR rate for distinct P&L calculation (Market Value)
-    usd_myr_price = StockPrice.query.get('USDMYR')
-    current_forex_rate = usd_myr_price.price if usd_myr_price else avg_forex_rate
+    current_forex_rate = get_current_forex_rate()
 
-    # Track detailed position information
-    positions = {}  # symbol -> position data
-    
-    for inv in investments:
-        if inv.symbol not in positions:
-            positions[inv.symbol] = {
-                'market': inv.market,
-                'currency': inv.currency,
-                'quantity': 0,
-                'cost_basis': 0,
-                'total_dividends': 0,
-                'realized_pnl': 0,
-                'first_buy_date': None,
-                'last_sell_date': None,
-                'total_bought': 0,
-                'total_sold': 0,
-                'avg_buy_price': 0,
-                'avg_sell_price': 0,
-                'buy_cost': 0,
-                'sell_proceeds': 0
-            }
-        
-        pos = positions[inv.symbol]
-        
-        if inv.type == 'Buy':
-            if pos['first_buy_date'] is None:
-                pos['first_buy_date'] = inv.date
-            pos['quantity'] += inv.quantity
-            pos['total_bought'] += inv.quantity
-            buy_cost = (inv.price * inv.quantity) + inv.fees
-            pos['cost_basis'] += buy_cost
-            pos['buy_cost'] += buy_cost
-            
-        elif inv.type == 'Sell':
-            if pos['quantity'] > 0:
-                # Calculate average cost per share
-                avg_cost_per_share = pos['cost_basis'] / pos['quantity']
-                cost_removed = avg_cost_per_share * inv.quantity
-                sale_proceeds = (inv.price * inv.quantity) - inv.fees
-                realized_pnl = sale_proceeds - cost_removed
-                
-                pos['realized_pnl'] += realized_pnl
-                pos['cost_basis'] -= cost_removed
-                pos['quantity'] -= inv.quantity
-                pos['total_sold'] += inv.quantity
-                pos['sell_proceeds'] += sale_proceeds
-                pos['last_sell_date'] = inv.date
-                
-        elif inv.type in ['Bonus', 'Split']:
-            pos['quantity'] += inv.quantity
-            pos['total_bought'] += inv.quantity
-            
-        elif inv.type == 'Dividend':
-            pos['total_dividends'] += inv.price
+    # Track detailed position information (materialized positions merged across brokerages)
+    positions = positions_by_symbol(get_positions(session.get('user_id')))  # symbol -> position data
     
     # Calculate average prices
     for symbol, pos in positions.items():
@@ -3472,7 +4101,9 @@ def reset_all_data():
         db.session.query(BalanceHistory).delete()
         db.session.query(Transaction).delete()
         db.session.query(Investment).delete()
+        db.session.query(Position).delete()
         db.session.query(MortgageEvent).delete()
+        db.session.query(MortgageCheckpoint).delete()
         db.session.query(Mortgage).delete()
         db.session.query(BalanceItem).delete()
         db.session.query(StockPrice).delete()
@@ -3707,6 +4338,8 @@ def sync_investment():
             user_id=session.get('user_id')
         )
         db.session.add(new_inv)
+        db.session.flush() # Get ID
+        record_investment(new_inv)
         db.session.commit()
         
         return jsonify({'success': True, 'id': new_inv.id}), 200
@@ -3814,11 +4447,14 @@ def delete_account():
         Transaction.query.filter_by(user_id=user_id).delete()
         BalanceHistory.query.filter_by(user_id=user_id).delete()
         Investment.query.filter_by(user_id=user_id).delete()
+        Position.query.filter_by(user_id=user_id).delete()
         ForexTransaction.query.filter_by(user_id=user_id).delete()
         PortfolioSnapshot.query.filter_by(user_id=user_id).delete()
         BudgetRecurring.query.filter_by(user_id=user_id).delete()
         BudgetGoal.query.filter_by(user_id=user_id).delete()
         MortgageEvent.query.filter_by(user_id=user_id).delete()
+        MortgageCheckpoint.query.filter_by(user_id=user_id).delete()
+        job_ids = delete_user_jobs(user_id)
         
         # 2. Delete Parent Records
         Mortgage.query.filter_by(user_id=user_id).delete()
@@ -3828,6 +4464,7 @@ def delete_account():
         # 3. Delete User
         db.session.delete(user)
         db.session.commit()
+        remove_job_files(job_ids) # Export results and uploaded statements
         
         # 4. Logout
         session.clear()
@@ -3863,11 +4500,14 @@ def reset_data():
         Transaction.query.filter_by(user_id=user_id).delete()
         BalanceHistory.query.filter_by(user_id=user_id).delete()
         Investment.query.filter_by(user_id=user_id).delete()
+        Position.query.filter_by(user_id=user_id).delete()
         ForexTransaction.query.filter_by(user_id=user_id).delete()
         PortfolioSnapshot.query.filter_by(user_id=user_id).delete()
         BudgetRecurring.query.filter_by(user_id=user_id).delete()
         BudgetGoal.query.filter_by(user_id=user_id).delete()
         MortgageEvent.query.filter_by(user_id=user_id).delete()
+        MortgageCheckpoint.query.filter_by(user_id=user_id).delete()
+        job_ids = delete_user_jobs(user_id)
         
         # Delete Parent Records (Manual items, mortgages, custom cats)
         Mortgage.query.filter_by(user_id=user_id).delete()
@@ -3875,6 +4515,7 @@ def reset_data():
         CustomCategory.query.filter_by(user_id=user_id).delete()
         
         db.session.commit()
+        remove_job_files(job_ids) # Export results and uploaded statements
         
         flash('All financial data has been reset to zero. Your account and profile settings are preserved.', 'success')
         return redirect(url_for('index'))
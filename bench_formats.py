@@ -0,0 +1,75 @@
+"""
+Export/import benchmark for the transaction file formats (xlsx, csv, parquet).
+
+Runs against a throwaway SQLite database, never instance/finance.db. Each format is
+exported from the same seeded ledger and then staged back through /import_transactions
+(as a second user, so nothing is skipped as a duplicate). Parquet needs pyarrow.
+Usage: python bench_formats.py [rows]
+"""
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+db_file = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + db_file
+
+from app import app, db, bulk_insert, User, Transaction, StagedImport  # noqa: E402
+
+
+def seed_transactions(user_id, n_rows, seed=7):
+    rng = random.Random(seed)
+    start = date(2020, 1, 1)
+    bulk_insert(Transaction, [{
+        'user_id': user_id,
+        'date': start + timedelta(days=i % 1500),
+        'description': f'Merchant {i}',
+        'category': rng.choice(['Food', 'Transport', 'Salary', 'Utilities']),
+        'amount': round(rng.uniform(-300, 300), 2),
+    } for i in range(n_rows)])
+    db.session.commit()
+
+
+def client_for(user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    return client
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    app.config['TESTING'] = True
+
+    try:
+        import pyarrow  # noqa: F401
+        formats = ['xlsx', 'csv', 'parquet']
+    except ImportError:
+        formats = ['xlsx', 'csv']
+        print("pyarrow not installed, skipping parquet")
+
+    with app.app_context():
+        owner = User(username='bench', password='x')
+        importer = User(username='bench-import', password='x')
+        db.session.add_all([owner, importer])
+        db.session.commit()
+        owner_id, importer_id = owner.id, importer.id
+        seed_transactions(owner_id, n_rows)
+
+    exporter, uploader = client_for(owner_id), client_for(importer_id)
+    print(f"{'format':<8} {'export':>9} {'size':>10} {'import':>9} {'staged':>9}")
+    for fmt in formats:
+        t0 = time.perf_counter()
+        r = exporter.get(f'/export_transactions?format={fmt}')
+        payload = r.get_data()
+        t1 = time.perf_counter()
+        uploader.post('/import_transactions', data={'file': (io.BytesIO(payload), f'export.{fmt}')},
+                      content_type='multipart/form-data')
+        t2 = time.perf_counter()
+        with app.app_context():
+            staged = StagedImport.query.filter_by(user_id=importer_id).count()
+        print(f"{fmt:<8} {t1 - t0:>8.2f}s {len(payload) / 1e6:>8.2f}MB {t2 - t1:>8.2f}s {staged:>9,}")
+    os.remove(db_file)
@@ -0,0 +1,42 @@
+"""
+Throughput benchmark for holdings_engine.compute_holdings.
+
+Usage: python bench_holdings.py [trades] [positions]
+"""
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from holdings_engine import Ledger, compute_holdings
+
+
+def build_ledger(n_trades, n_positions, seed=42):
+    rng = random.Random(seed)
+    keys = [(1, f"SYM{i}", rng.choice(['Moomoo', 'Maybank Trade', ''])) for i in range(n_positions)]
+    start = date(2015, 1, 1)
+    ledger = Ledger()
+    for i in range(n_trades):
+        roll = rng.random()
+        trade_type = 'Buy' if roll < 0.6 else 'Sell' if roll < 0.85 else 'Dividend' if roll < 0.97 else 'Bonus'
+        ledger.append(
+            rng.choice(keys), trade_type,
+            rng.randint(1, 100), rng.uniform(1, 500), rng.uniform(0, 10),
+            start + timedelta(days=i * 3650 // n_trades), i + 1
+        )
+    return ledger
+
+
+if __name__ == "__main__":
+    n_trades = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    n_positions = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+
+    t0 = time.perf_counter()
+    ledger = build_ledger(n_trades, n_positions)
+    t1 = time.perf_counter()
+    holdings = compute_holdings(ledger)
+    t2 = time.perf_counter()
+
+    print(f"Ledger build : {n_trades:,} trades in {t1 - t0:.2f}s")
+    print(f"Replay       : {len(holdings):,} positions in {t2 - t1:.2f}s "
+          f"({n_trades / (t2 - t1):,.0f} trades/s)")
@@ -0,0 +1,73 @@
+"""
+End-to-end benchmark for the transaction import (upload -> staging -> confirm).
+
+Runs against a throwaway SQLite database, never instance/finance.db.
+Usage: python bench_import.py [rows]
+"""
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from openpyxl import Workbook
+
+db_file = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + db_file
+
+from app import app, db, User, Transaction, StagedImport  # noqa: E402
+
+
+def build_statement(n_rows, seed=7):
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(['Date', 'Description', 'Category', 'Amount'])
+    start = date(2020, 1, 1)
+    for i in range(n_rows):
+        ws.append([start + timedelta(days=i % 1500), f'Merchant {i}',
+                   rng.choice(['Food', 'Transport', 'Salary', 'Utilities']),
+                   round(rng.uniform(-300, 300), 2)])
+    output = io.BytesIO()
+    wb.save(output)
+    output.seek(0)
+    return output
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        user = User(username='bench', password='x')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+
+    statement = build_statement(n_rows)
+
+    t0 = time.perf_counter()
+    r = client.post('/import_transactions', data={'file': (statement, 'statement.xlsx')},
+                    content_type='multipart/form-data')
+    t1 = time.perf_counter()
+    with app.app_context():
+        staged_ids = [str(row_id) for (row_id,) in db.session.query(StagedImport.id)]
+    r = client.post('/confirm_import', data={
+        'import_ids': staged_ids,
+        'auto_create_categories': '1'
+    })
+    t2 = time.perf_counter()
+
+    with app.app_context():
+        imported = Transaction.query.filter_by(user_id=user_id).count()
+
+    print(f"Stage   : {n_rows:,} rows in {t1 - t0:.2f}s ({n_rows / (t1 - t0):,.0f} rows/s)")
+    print(f"Confirm : {imported:,} rows in {t2 - t1:.2f}s ({imported / (t2 - t1):,.0f} rows/s)")
+    print(f"Total   : {t2 - t0:.2f}s")
+    os.remove(db_file)
@@ -0,0 +1,48 @@
+"""
+Benchmark for the mortgage scheduler on long loans with many events.
+
+Builds 35-year loans with hundreds of PAYMENT and RATE_CHANGE events (half the term
+already in the past) and times mortgage_engine.build_schedule() on them. Only the
+engine is imported, so no database is opened.
+Usage: python bench_mortgage.py [loans] [events]
+"""
+import random
+import sys
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from mortgage_engine import build_schedule
+
+
+def build_mortgage(n_events, seed):
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=int(365.25 * 17.5))
+    principal = 800_000.0
+    events = [SimpleNamespace(date=start, type='RATE_CHANGE', value=4.2, balance_after=principal)]
+    balance = principal
+    for k in range(n_events):
+        event_date = start + timedelta(days=(k + 1) * 35 * 365 // (n_events + 1))
+        if rng.random() < 0.25:
+            events.append(SimpleNamespace(date=event_date, type='RATE_CHANGE',
+                                          value=round(rng.uniform(2.5, 6.0), 2), balance_after=None))
+        else:
+            balance = max(balance - rng.uniform(1_000, 4_000), 0.0)
+            events.append(SimpleNamespace(date=event_date, type='PAYMENT',
+                                          value=rng.uniform(3_000, 5_000), balance_after=balance))
+    return SimpleNamespace(start_date=start, term_years=35, original_principal=principal,
+                           has_mrta=True, mrta_original_amount=principal, mrta_rate=4.0, events=events)
+
+
+if __name__ == "__main__":
+    n_loans = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    n_events = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    mortgages = [build_mortgage(n_events, seed) for seed in range(n_loans)]
+
+    today = date.today()
+    t0 = time.perf_counter()
+    rows = sum(len(build_schedule(m, today)) for m in mortgages)
+    elapsed = time.perf_counter() - t0
+
+    print(f"Schedules : {n_loans:,} loans x {n_events:,} events, {rows:,} rows in {elapsed:.2f}s")
+    print(f"Per loan  : {elapsed / n_loans * 1000:.2f}ms")
@@ -0,0 +1,100 @@
+"""
+Cash forecast engine behind /api/forecast.
+
+recurring_dates() expands a BudgetRecurring item into the dates it falls on, by its
+real frequency: Monthly items on day_of_month (clamped to short months), Yearly items
+on day_of_month of month_of_year, Weekly items every 7 days. forecast_events() merges
+those streams and the BudgetGoal targets into one date-ordered stream of signed cash
+movements, and running_balance() folds that stream into a daily or month-end balance.
+Everything is a generator, so a 10-year horizon only costs the points it returns.
+"""
+import heapq
+from datetime import date, timedelta
+
+from mortgage_engine import add_months, days_in_month
+
+DAILY, MONTHLY = 'daily', 'monthly'
+MAX_FORECAST_MONTHS = 120
+
+
+def _month_day(year, month, day):
+    return date(year, month, min(day, days_in_month(year, month)))
+
+
+def recurring_dates(item, start, end):
+    """Dates in [start, end] on which item recurs. Works on any object with the BudgetRecurring attributes."""
+    day = item.day_of_month or 1
+    created = item.created_at.date() if item.created_at else start
+    if item.frequency == 'Weekly':
+        # No weekday is stored, so the series is anchored on day_of_month of the month it was added
+        current = _month_day(created.year, created.month, day)
+        if current < start:
+            current += timedelta(days=-(-(start - current).days // 7) * 7)
+        while current <= end:
+            yield current
+            current += timedelta(days=7)
+    elif item.frequency == 'Yearly':
+        month = item.month_of_year or created.month
+        for year in range(start.year, end.year + 1):
+            current = _month_day(year, month, day)
+            if start <= current <= end:
+                yield current
+    else:
+        year, month = start.year, start.month
+        while True:
+            current = _month_day(year, month, day)
+            if current > end:
+                return
+            if current >= start:
+                yield current
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def forecast_events(recurring, goals, start, end):
+    """Date-ordered (date, amount) stream of recurring income (+), expenses (-) and goal targets (-)."""
+    def signed(item):
+        amount = item.amount if item.type == 'Income' else -item.amount
+        return ((current, amount) for current in recurring_dates(item, start, end))
+
+    goal_events = sorted((goal.target_date, -goal.target_amount) for goal in goals
+                         if start <= goal.target_date <= end)
+    return heapq.merge(goal_events, *(signed(item) for item in recurring), key=lambda e: e[0])
+
+
+def period_ends(today, months, granularity=MONTHLY):
+    """
+    Forecast points after today up to the end of the month that is months ahead: every
+    day, or the end of each following month (the rest of this month lands in the first).
+    """
+    if granularity == DAILY:
+        horizon = add_months(today, months)
+        for offset in range(1, (_month_day(horizon.year, horizon.month, 31) - today).days + 1):
+            yield today + timedelta(days=offset)
+        return
+    for ahead in range(1, months + 1):
+        month = add_months(today, ahead)
+        yield _month_day(month.year, month.month, 31)
+
+
+def running_balance(opening, events, points):
+    """(point, balance) after all events on or before each point, consuming events once."""
+    balance = opening
+    events = iter(events)
+    pending = next(events, None)
+    for point in points:
+        while pending is not None and pending[0] <= point:
+            balance += pending[1]
+            pending = next(events, None)
+        yield point, balance
+
+
+def forecast(opening, recurring, goals, today, months=6, granularity=MONTHLY):
+    """
+    Projected balance from the day after today to the end of the month that is months
+    ahead. Returns a generator of (date, balance) points at the requested granularity;
+    monthly gives one point per following month, like the original 6-month chart.
+    """
+    horizon = add_months(today, months)
+    end = _month_day(horizon.year, horizon.month, 31)
+    events = forecast_events(recurring, goals, today + timedelta(days=1), end)
+    return running_balance(opening, events, period_ends(today, months, granularity))
@@ -0,0 +1,144 @@
+"""
+Average-cost holdings engine shared by every portfolio view.
+
+The trade ledger is held column-wise in typed arrays (one entry per trade, already
+sorted in (date, id) order) and compute_holdings() derives every position in a
+single pass: quantity, cost basis, realized P&L, dividends and first-buy date.
+"""
+from array import array
+from datetime import date
+
+BUY, SELL, BONUS, SPLIT, DIVIDEND, OTHER = range(6)
+TYPE_CODES = {'Buy': BUY, 'Sell': SELL, 'Bonus': BONUS, 'Split': SPLIT, 'Dividend': DIVIDEND}
+
+# Per-position results (dates are datetime.date or None)
+HOLDING_FIELDS = ['quantity', 'cost_basis', 'total_dividends', 'realized_pnl',
+                  'total_bought', 'total_sold', 'buy_cost', 'sell_proceeds',
+                  'first_buy_date', 'last_sell_date', 'last_trade_date', 'last_trade_id']
+
+
+class Ledger:
+    """Columnar trade ledger. Position keys are interned to small integers."""
+
+    def __init__(self):
+        self.keys = []
+        self._key_index = {}
+        self.position = array('l')
+        self.kind = array('b')
+        self.quantity = array('d')
+        self.price = array('d')
+        self.fees = array('d')
+        self.date = array('l')  # date.toordinal()
+        self.trade_id = array('q')
+
+    def __len__(self):
+        return len(self.kind)
+
+    def append(self, key, trade_type, quantity, price, fees, trade_date, trade_id=0):
+        index = self._key_index.get(key)
+        if index is None:
+            index = self._key_index[key] = len(self.keys)
+            self.keys.append(key)
+        self.position.append(index)
+        self.kind.append(TYPE_CODES.get(trade_type, OTHER))
+        self.quantity.append(quantity or 0.0)
+        self.price.append(price or 0.0)
+        self.fees.append(fees or 0.0)
+        self.date.append(trade_date.toordinal())
+        self.trade_id.append(trade_id or 0)
+
+
+def _to_ordinal(value):
+    return value.toordinal() if value else 0
+
+
+def _to_date(ordinal):
+    return date.fromordinal(ordinal) if ordinal else None
+
+
+def compute_holdings(ledger, initial=None):
+    """
+    Replays the ledger with average cost and returns {key: {field: value}} for HOLDING_FIELDS.
+    initial optionally maps keys to a previous result, so new trades can be applied on top
+    of a stored position instead of replaying its whole history.
+    """
+    n = len(ledger.keys)
+    quantity = array('d', [0.0]) * n
+    cost_basis = array('d', [0.0]) * n
+    dividends = array('d', [0.0]) * n
+    realized = array('d', [0.0]) * n
+    bought = array('d', [0.0]) * n
+    sold = array('d', [0.0]) * n
+    buy_cost = array('d', [0.0]) * n
+    proceeds = array('d', [0.0]) * n
+    first_buy = array('l', [0]) * n
+    last_sell = array('l', [0]) * n
+    last_date = array('l', [0]) * n
+    last_id = array('q', [0]) * n
+
+    for key, state in (initial or {}).items():
+        p = ledger._key_index.get(key)
+        if p is None:
+            continue
+        quantity[p] = state['quantity']
+        cost_basis[p] = state['cost_basis']
+        dividends[p] = state['total_dividends']
+        realized[p] = state['realized_pnl']
+        bought[p] = state['total_bought']
+        sold[p] = state['total_sold']
+        buy_cost[p] = state['buy_cost']
+        proceeds[p] = state['sell_proceeds']
+        first_buy[p] = _to_ordinal(state['first_buy_date'])
+        last_sell[p] = _to_ordinal(state['last_sell_date'])
+        last_date[p] = _to_ordinal(state['last_trade_date'])
+        last_id[p] = state['last_trade_id'] or 0
+
+    for p, kind, qty, price, fees, day, trade_id in zip(
+            ledger.position, ledger.kind, ledger.quantity, ledger.price,
+            ledger.fees, ledger.date, ledger.trade_id):
+        if kind == BUY:
+            if not first_buy[p] or day < first_buy[p]:
+                first_buy[p] = day
+            cost = price * qty + fees
+            quantity[p] += qty
+            bought[p] += qty
+            cost_basis[p] += cost
+            buy_cost[p] += cost
+        elif kind == SELL:
+            held = quantity[p]
+            if held > 0:
+                # Reduce cost basis proportionally (average cost)
+                cost_removed = cost_basis[p] / held * qty
+                sale = price * qty - fees
+                realized[p] += sale - cost_removed
+                cost_basis[p] -= cost_removed
+                quantity[p] = held - qty
+                sold[p] += qty
+                proceeds[p] += sale
+                last_sell[p] = day
+        elif kind == BONUS or kind == SPLIT:
+            # Cost basis does not change for Bonus/Split
+            quantity[p] += qty
+            bought[p] += qty
+        elif kind == DIVIDEND:
+            dividends[p] += price  # Price stores the total dividend amount
+        last_date[p] = day
+        last_id[p] = trade_id
+
+    return {
+        key: {
+            'quantity': quantity[p],
+            'cost_basis': cost_basis[p],
+            'total_dividends': dividends[p],
+            'realized_pnl': realized[p],
+            'total_bought': bought[p],
+            'total_sold': sold[p],
+            'buy_cost': buy_cost[p],
+            'sell_proceeds': proceeds[p],
+            'first_buy_date': _to_date(first_buy[p]),
+            'last_sell_date': _to_date(last_sell[p]),
+            'last_trade_date': _to_date(last_date[p]),
+            'last_trade_id': last_id[p] or None,
+        }
+        for p, key in enumerate(ledger.keys)
+    }
@@ -0,0 +1,410 @@
+"""
+Mortgage engine: interest accrual and the monthly schedule.
+
+apply_events() replays RATE_CHANGE and PAYMENT events on a LoanState, accruing
+interest between events (actual/365 for daily rest, 30/360 for monthly rest) and
+splitting each payment into interest first, then principal. Payments recorded before
+the accrual existed were principal-only with a user-entered balance_after; those
+(PAYMENT_PRINCIPAL) are taken as known balances and restart the accrual. It also returns a
+checkpoint of the state at every 1 January it crosses, so callers can persist them
+and later resume from the nearest one instead of replaying from inception.
+
+build_schedule() lays a loan out month by month. Events are sorted and bucketed by
+(year, month) once, so the layout is O(months + events), and projected months reuse
+the level (annuity) payment of the current rate segment instead of re-deriving
+(1 + r) ** n every month. Both work on any objects with the Mortgage/MortgageEvent
+attributes, so callers can pass ORM rows or plain stand-ins.
+
+simulate_scenarios() takes the projected part of a schedule and runs many what-if
+scenarios over it in one month-by-month pass, each scenario's state held in flat
+arrays (one slot per scenario).
+"""
+import math
+from array import array
+from datetime import date, datetime
+from functools import lru_cache
+
+ACCRUAL_DAILY, ACCRUAL_MONTHLY = 'daily', 'monthly'
+PAYMENT_TOTAL, PAYMENT_PRINCIPAL = 'TOTAL', 'PRINCIPAL'
+
+_MONTH_DAYS = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def days_in_month(year, month):
+    if month == 2 and (year % 4 == 0 and year % 100 != 0 or year % 400 == 0):
+        return 29
+    return _MONTH_DAYS[month - 1]
+
+
+def add_months(sourcedate, months):
+    month = sourcedate.month - 1 + months
+    year = sourcedate.year + month // 12
+    month = month % 12 + 1
+    return date(year, month, min(sourcedate.day, days_in_month(year, month)))
+
+
+def month_dates(start, count):
+    """start and the following count - 1 monthly dates, clamped to month ends like add_months."""
+    year, month, day = start.year, start.month, start.day
+    for _ in range(count):
+        yield date(year, month, min(day, days_in_month(year, month)))
+        if month == 12:
+            year, month = year + 1, 1
+        else:
+            month += 1
+
+
+def annuity_payment(balance, monthly_rate, months):
+    """Level monthly payment that clears balance over months (straight-line at 0%)."""
+    if monthly_rate > 0 and balance > 0:
+        growth = (1 + monthly_rate) ** months
+        return balance * monthly_rate * growth / (growth - 1)
+    return balance / months if months > 0 else 0
+
+
+@lru_cache(maxsize=256)
+def mrta_coverage_curve(amount, annual_rate, months):
+    """
+    Decreasing-term MRTA cover for months 0..months, in closed form:
+    B_k = B_0 * ((1 + r)^n - (1 + r)^k) / ((1 + r)^n - 1).
+    Cached per cover configuration, so a mortgage's curve is built once. Without a
+    rate the cover has no repayment schedule to follow and stays level.
+    """
+    amount = amount or 0.0
+    monthly_rate = (annual_rate or 0) / 100 / 12
+    if monthly_rate <= 0:
+        return (amount,) * (months + 1)
+    growth = (1 + monthly_rate) ** months
+    return tuple(max(0.0, amount * (growth - (1 + monthly_rate) ** k) / (growth - 1)) for k in range(months + 1))
+
+
+def year_fraction(start, end, basis=ACCRUAL_DAILY):
+    """Length of [start, end) in years: actual/365 (daily rest) or 30E/360 (monthly rest)."""
+    if basis == ACCRUAL_MONTHLY:
+        days = ((end.year - start.year) * 360 + (end.month - start.month) * 30
+                + min(end.day, 30) - min(start.day, 30))
+        return days / 360
+    return (end - start).days / 365
+
+
+class LoanState:
+    """Principal outstanding, annual rate (%) and unpaid accrued interest as of date."""
+    __slots__ = ('date', 'balance', 'rate', 'accrued')
+
+    def __init__(self, date, balance, rate, accrued=0.0):
+        self.date = date
+        self.balance = balance
+        self.rate = rate
+        self.accrued = accrued
+
+    def copy(self):
+        return LoanState(self.date, self.balance, self.rate, self.accrued)
+
+
+def sort_events(events):
+    # Stable, so same-day events keep their recorded order
+    return sorted(events, key=lambda e: e.date)
+
+
+def opening_state(mortgage, events):
+    """State at inception. The first rate change (events sorted) sets the opening rate, whatever its date."""
+    rate = next((e.value for e in events if e.type == 'RATE_CHANGE'), 0.0)
+    return LoanState(mortgage.start_date, mortgage.original_principal, rate)
+
+
+def accrue(state, until, basis=ACCRUAL_DAILY):
+    """Adds the interest on the outstanding principal from state.date to until."""
+    if until > state.date:
+        state.accrued += state.balance * state.rate / 100 * year_fraction(state.date, until, basis)
+        state.date = until
+
+
+def apply_events(state, events, basis=ACCRUAL_DAILY, until=None):
+    """
+    Replays events (sorted by date) on state in place, then accrues up to until if
+    given. Returns (splits, checkpoints): splits lists (event, interest, principal,
+    balance_after) for each PAYMENT, and checkpoints are copies of the state on each
+    1 January crossed, taken before that day's events.
+    """
+    splits = []
+    checkpoints = []
+
+    def advance(to):
+        for year in range(state.date.year + 1, to.year + 1):
+            accrue(state, date(year, 1, 1), basis)
+            checkpoints.append(state.copy())
+        accrue(state, to, basis)
+
+    for event in events:
+        advance(event.date)
+        if event.type == 'RATE_CHANGE':
+            state.rate = event.value
+        elif event.type == 'PAYMENT' and getattr(event, 'payment_kind', None) == PAYMENT_PRINCIPAL:
+            # Legacy entry: the value was principal only and balance_after is a known
+            # balance, so interest up to here counts as settled and accrual starts afresh
+            if event.balance_after is not None:
+                state.balance = event.balance_after
+            else:
+                state.balance = max(0.0, state.balance - event.value)
+            state.accrued = 0.0
+            splits.append((event, 0.0, event.value, state.balance))
+        elif event.type == 'PAYMENT':
+            # Accrued interest is settled first; anything beyond payoff is ignored
+            interest = min(event.value, state.accrued)
+            principal = min(event.value - interest, state.balance)
+            state.accrued -= interest
+            state.balance -= principal
+            splits.append((event, interest, principal, state.balance))
+    if until is not None:
+        advance(until)
+    return splits, checkpoints
+
+
+def bucket_payments(splits):
+    """{(year, month): (paid, interest, principal, balance after the month's last payment)}."""
+    payments = {}
+    for event, interest, principal, balance_after in splits:
+        key = (event.date.year, event.date.month)
+        paid, interest_total, principal_total, _ = payments.get(key, (0, 0, 0, None))
+        payments[key] = (paid + event.value, interest_total + interest, principal_total + principal, balance_after)
+    return payments
+
+
+def build_schedule(mortgage, today, basis=ACCRUAL_DAILY):
+    """
+    Monthly rows from inception (row 0) to the end of the term or payoff. Months up to
+    today show that month's payments, split into interest and principal by the accrual
+    replay; later months are projected at the rate in force. The MRTA column is the
+    cover's own fixed amortization from inception (mrta_coverage_curve), and net
+    exposure is the balance less that curve.
+    """
+    events = sort_events(mortgage.events)
+    state = opening_state(mortgage, events)
+    rate = state.rate
+    payments = bucket_payments(apply_events(state, events, basis)[0])
+    total_months = mortgage.term_years * 12
+
+    balance = mortgage.original_principal
+
+    schedule = []
+    exposed = [] # Balance each row's net exposure is measured against
+    next_event = 0
+    segment_rate = None # Rate the current level payment was computed for
+    level_payment = 0
+    for i, row_date in enumerate(month_dates(mortgage.start_date, total_months + 1)):
+        while next_event < len(events) and events[next_event].date <= row_date:
+            if events[next_event].type == 'RATE_CHANGE':
+                rate = events[next_event].value
+            next_event += 1
+
+        row = {
+            'no': i,
+            'date': row_date,
+            'rate': rate
+        }
+
+        if row_date <= today:
+            row['type'] = 'History'
+            exposed.append(balance) # Opening balance of the month
+            paid, interest, principal, balance_after = payments.get((row_date.year, row_date.month), (0, 0, 0, None))
+            if balance_after is not None:
+                balance = balance_after
+            row['payment'] = paid
+            row['interest_paid'] = interest
+            row['principal_paid'] = principal
+            row['balance'] = balance
+        else:
+            row['type'] = 'Projected'
+            monthly_rate = rate / 100 / 12
+            if rate != segment_rate:
+                # Remaining balance amortized over the remaining months; constant until the rate moves
+                level_payment = annuity_payment(balance, monthly_rate, total_months - i + 1)
+                segment_rate = rate
+            interest = balance * monthly_rate
+            principal = level_payment - interest
+            balance -= principal
+            if balance < 0:
+                balance = 0
+
+            row['payment'] = level_payment
+            row['interest_paid'] = interest
+            row['principal_paid'] = principal
+            row['balance'] = balance
+            exposed.append(balance)
+
+        schedule.append(row)
+        if balance <= 0 and i > 0:
+            break # Paid off
+
+    if mortgage.has_mrta:
+        coverage = mrta_coverage_curve(mortgage.mrta_original_amount, mortgage.mrta_rate, total_months)
+    else:
+        coverage = (0,) * (total_months + 1)
+    for row, row_balance, cover in zip(schedule, exposed, coverage):
+        row['mrta_coverage'] = cover
+        row['net_exposure'] = max(0, row_balance - cover)
+
+    return schedule
+
+
+MAX_SCENARIOS = 50
+MAX_REFINANCE_YEARS = 50
+PAID_OFF = 0.005 # Balances below half a cent count as settled
+
+
+def _parse_date(value, field):
+    try:
+        return datetime.strptime(str(value), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'{field}: expected a YYYY-MM-DD date, got {value!r}')
+
+
+def _parse_amount(value, field, minimum=None):
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        amount = None
+    if amount is None or not math.isfinite(amount):
+        raise ValueError(f'{field}: expected a number, got {value!r}')
+    if minimum is not None and amount < minimum:
+        raise ValueError(f'{field}: must be at least {minimum}, got {value!r}')
+    return amount
+
+
+def _parse_objects(value, field):
+    """A JSON list of objects; missing or null is an empty list."""
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(item, dict) for item in value):
+        raise ValueError(f'{field}: expected a list of objects')
+    return value
+
+
+class Scenario:
+    """
+    One what-if from its JSON spec: extra_monthly (added to every instalment),
+    lump_sums [{date, amount}], rate_shocks [{date, delta}] (percentage points added
+    from that date) and refinance {date, rate, term_years}. Payments and rates can't be
+    negative; a shock can take the rate down to 0% but not below (see simulate_scenarios).
+    """
+
+    def __init__(self, spec, index=0):
+        if not isinstance(spec, dict):
+            raise ValueError(f'Scenario {index + 1}: expected an object')
+        label = spec.get('name') or f'Scenario {index + 1}'
+        self.name = str(label)
+        self.extra_monthly = _parse_amount(spec.get('extra_monthly', 0), f'{label}: extra_monthly', minimum=0)
+        self.lump_sums = {}
+        for lump in _parse_objects(spec.get('lump_sums'), f'{label}: lump_sums'):
+            lump_date = _parse_date(lump.get('date'), f'{label}: lump_sums.date')
+            key = (lump_date.year, lump_date.month)
+            self.lump_sums[key] = self.lump_sums.get(key, 0) + _parse_amount(lump.get('amount'), f'{label}: lump_sums.amount', minimum=0)
+        self.rate_shocks = sorted(
+            (_parse_date(shock.get('date'), f'{label}: rate_shocks.date'),
+             _parse_amount(shock.get('delta'), f'{label}: rate_shocks.delta'))
+            for shock in _parse_objects(spec.get('rate_shocks'), f'{label}: rate_shocks')
+        )
+        refinance = spec.get('refinance')
+        if refinance is not None and not isinstance(refinance, dict):
+            raise ValueError(f'{label}: refinance: expected an object')
+        if refinance:
+            self.refinance_date = _parse_date(refinance.get('date'), f'{label}: refinance.date')
+            self.refinance_rate = _parse_amount(refinance.get('rate'), f'{label}: refinance.rate', minimum=0)
+            self.refinance_months = int(_parse_amount(refinance.get('term_years'), f'{label}: refinance.term_years') * 12)
+            if not 0 < self.refinance_months <= MAX_REFINANCE_YEARS * 12:
+                raise ValueError(f'{label}: refinance.term_years must be between 1 and {MAX_REFINANCE_YEARS}')
+        else:
+            self.refinance_date = None
+
+
+def simulate_scenarios(mortgage, schedule, scenarios):
+    """
+    Runs each Scenario over the projected months of schedule (from build_schedule),
+    all in one month-by-month pass. Instalments follow the schedule's rules: the level
+    payment for the remaining term is recomputed when a scenario's rate changes, and
+    extra payments shorten the loan rather than lowering the instalment.
+    Returns (dates, results): results has a dict per scenario with total_interest,
+    total_paid, payoff_date and net_exposure (balance less MRTA cover, aligned with
+    dates). An empty Scenario reproduces the schedule's own projection.
+    """
+    projected = [row for row in schedule if row['type'] == 'Projected']
+    n = len(scenarios)
+    if not projected:
+        return [], [{'total_interest': 0.0, 'total_paid': 0.0, 'payoff_date': None, 'net_exposure': []}
+                    for _ in scenarios]
+
+    # Shared timeline: the schedule's remaining months, extended for refinancing past the term
+    first_no = projected[0]['no']
+    term_end = mortgage.term_years * 12
+    dates = [row['date'] for row in projected]
+    rates = [row['rate'] for row in projected]
+    mrta = [row['mrta_coverage'] for row in projected]
+    loan_end = [term_end] * n
+    for scenario in scenarios:
+        if scenario.refinance_date:
+            months_to_refinance = sum(1 for d in dates if d < scenario.refinance_date)
+            last_no = first_no + months_to_refinance + scenario.refinance_months - 1
+            for no in range(first_no + len(dates), last_no + 1):
+                dates.append(add_months(mortgage.start_date, no))
+                rates.append(rates[-1])
+                mrta.append(0.0) # The MRTA cover runs with the original term
+
+    opening = projected[0]['balance'] + projected[0]['principal_paid']
+    balance = array('d', [opening]) * n
+    payment = array('d', [0.0]) * n
+    interest_total = array('d', [0.0]) * n
+    paid_total = array('d', [0.0]) * n
+    segment_rate = [None] * n
+    shock_index = [0] * n
+    shock_total = array('d', [0.0]) * n
+    refinanced = [False] * n
+    payoff = [None] * n
+    balances = [array('d') for _ in range(n)] # Month-end balance per scenario until payoff
+
+    active = n
+    for k, row_date in enumerate(dates):
+        if not active:
+            break
+        no = first_no + k
+        month_key = (row_date.year, row_date.month)
+        for s, scenario in enumerate(scenarios):
+            if payoff[s] is not None:
+                continue
+            shocks = scenario.rate_shocks
+            while shock_index[s] < len(shocks) and shocks[shock_index[s]][0] <= row_date:
+                shock_total[s] += shocks[shock_index[s]][1]
+                shock_index[s] += 1
+            if scenario.refinance_date and not refinanced[s] and scenario.refinance_date <= row_date:
+                refinanced[s] = True
+                loan_end[s] = no + scenario.refinance_months - 1
+                segment_rate[s] = None # New loan, new instalment
+            # Shocks move the rate in force but never below 0%
+            rate = max(0.0, (scenario.refinance_rate if refinanced[s] else rates[k]) + shock_total[s])
+
+            monthly_rate = rate / 100 / 12
+            if rate != segment_rate[s]:
+                payment[s] = annuity_payment(balance[s], monthly_rate, max(loan_end[s] - no + 1, 1))
+                segment_rate[s] = rate
+            interest = balance[s] * monthly_rate
+            principal = payment[s] - interest + scenario.extra_monthly + scenario.lump_sums.get(month_key, 0)
+            if principal > balance[s]:
+                principal = balance[s]
+            balance[s] -= principal
+            interest_total[s] += interest
+            paid_total[s] += interest + principal
+            balances[s].append(balance[s])
+            if balance[s] <= PAID_OFF or no >= loan_end[s]:
+                payoff[s] = row_date
+                active -= 1
+
+    results = []
+    for s in range(n):
+        # Net exposure is the balance curve less the shared MRTA curve; nothing is owed after payoff
+        exposure = [max(0, b - cover) for b, cover in zip(balances[s], mrta)]
+        results.append({
+            'total_interest': interest_total[s],
+            'total_paid': paid_total[s],
+            'payoff_date': payoff[s],
+            'net_exposure': exposure + [0.0] * (len(dates) - len(exposure))
+        })
+    return dates, results
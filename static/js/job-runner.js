@@ -0,0 +1,80 @@
+// Finance Tracker - Background Jobs
+// Runs imports/exports marked with data-background-job as server-side jobs and polls their progress
+
+class JobRunner {
+    // Give up a little after the server's own job timeout (JOB_TIMEOUT_MINUTES)
+    constructor(pollInterval = 1000, maxWait = 65 * 60 * 1000) {
+        this.pollInterval = pollInterval;
+        this.maxWait = maxWait;
+    }
+
+    // Hook up forms and links that opt in with data-background-job
+    init() {
+        document.querySelectorAll('form[data-background-job]').forEach((form) => {
+            form.addEventListener('submit', (event) => {
+                event.preventDefault();
+                const data = new FormData(form);
+                data.append('background', '1');
+                this.run(form.querySelector('[type="submit"]'), fetch(form.action, { method: 'POST', body: data }));
+            });
+        });
+
+        document.querySelectorAll('a[data-background-job]').forEach((link) => {
+            link.addEventListener('click', (event) => {
+                event.preventDefault();
+                const url = new URL(link.href, window.location.href);
+                url.searchParams.set('background', '1');
+                this.run(link, fetch(url));
+            });
+        });
+    }
+
+    // Start the job, show progress on the control, then open the result (file, page or redirect)
+    async run(control, request) {
+        const label = control.innerHTML;
+        control.classList.add('disabled');
+        control.disabled = true;
+        try {
+            const response = await request;
+            const started = await response.json();
+            if (!response.ok) {
+                throw new Error(started.error || 'Could not start the job');
+            }
+
+            const job = await this.waitFor(started.status_url, control);
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'The job failed');
+            }
+            window.location = job.result_url;
+        } catch (error) {
+            console.error('Background job failed:', error);
+            alert(error.message);
+        } finally {
+            control.innerHTML = label;
+            control.classList.remove('disabled');
+            control.disabled = false;
+        }
+    }
+
+    async waitFor(statusUrl, control) {
+        const deadline = Date.now() + this.maxWait;
+        while (Date.now() < deadline) {
+            const response = await fetch(statusUrl);
+            if (!response.ok) {
+                throw new Error(`Could not check the job (HTTP ${response.status})`);
+            }
+            const job = await response.json();
+            if (job.status === 'done' || job.status === 'failed') {
+                return job;
+            }
+
+            const progress = job.processed ? `${job.processed.toLocaleString()} rows` : job.status;
+            control.innerHTML = `<span class="spinner-border spinner-border-sm"></span> ${progress}`;
+            await new Promise((resolve) => setTimeout(resolve, this.pollInterval));
+        }
+        throw new Error('The job is taking too long; check back later');
+    }
+}
+
+const jobRunner = new JobRunner();
+document.addEventListener('DOMContentLoaded', () => jobRunner.init());
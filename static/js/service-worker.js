@@ -1,5 +1,5 @@
-// Finance Tracker - Service Worker (Production v2.8)
-const CACHE_NAME = 'finance-tracker-v2.8-security';
+// Finance Tracker - Service Worker (Production v2.9.1)
+const CACHE_NAME = 'finance-tracker-v2.9.1-jobs';
 const urlsToCache = [
     '/',
     '/login',
@@ -9,6 +9,7 @@ const urlsToCache = [
     '/static/css/design-system.css',
     '/static/js/offline-db.js',
     '/static/js/sync-manager.js',
+    '/static/js/job-runner.js',
     'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
     'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
     'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.1/font/bootstrap-icons.css'
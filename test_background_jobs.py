@@ -0,0 +1,118 @@
+import os
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'jobs.db')
+
+from werkzeug.security import generate_password_hash
+
+import app as finance_app
+from app import app, db, User, Transaction, BackgroundJob
+
+def login_client():
+    with app.app_context():
+        user = User(username=f'jobs-{uuid.uuid4().hex[:8]}', password=generate_password_hash('x'))
+        db.session.add(user)
+        db.session.flush()
+        db.session.add_all([Transaction(user_id=user.id, date=date(2024, 1, day), description=f'Item {day}',
+                                        category='Food', amount=-day) for day in range(1, 4)])
+        db.session.commit()
+        user_id = user.id
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    return client
+
+def wait_for(client, status_url):
+    for _ in range(100):
+        job = client.get(status_url).get_json()
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'Job still {job["status"]}')
+
+def test_export_job_runs_in_background():
+    finance_app.JOB_FOLDER = tempfile.mkdtemp()
+    client = login_client()
+
+    r = client.get('/export_transactions?format=csv&background=1')
+    assert r.status_code == 202
+    job = wait_for(client, r.get_json()['status_url'])
+    assert job['status'] == 'done' and job['error'] is None
+
+    result = client.get(job['result_url'])
+    assert result.status_code == 200
+    assert result.mimetype == 'text/csv'
+    lines = result.get_data(as_text=True).splitlines()
+    assert lines[0].startswith('Date,Description') and len(lines) == 4
+    assert 'attachment' in result.headers['Content-Disposition']
+
+def test_failed_job_records_error():
+    finance_app.JOB_FOLDER = tempfile.mkdtemp()
+    client = login_client()
+
+    def broken_rows(user_id):
+        raise RuntimeError('export source unavailable')
+    original = finance_app.export_transaction_rows
+    finance_app.export_transaction_rows = broken_rows
+    try:
+        r = client.get('/export_transactions?background=1')
+        job = wait_for(client, r.get_json()['status_url'])
+    finally:
+        finance_app.export_transaction_rows = original
+
+    assert job['status'] == 'failed' and job['result_url'] is None
+    with app.app_context():
+        row = db.session.get(BackgroundJob, job['id'])
+        assert row.error == 'export source unavailable' and row.finished_at is not None
+    assert client.get(f'/jobs/{job["id"]}/result').status_code == 409
+
+def test_stuck_jobs_expire_and_purge():
+    finance_app.JOB_FOLDER = tempfile.mkdtemp()
+    client = login_client()
+    with client.session_transaction() as sess:
+        user_id = sess['user_id']
+    now = datetime.utcnow()
+    with app.app_context():
+        # Left behind by a restart: one recent enough to poll, one past retention with its upload
+        db.session.add_all([
+            BackgroundJob(id=str(uuid.uuid4()), user_id=user_id, kind='import_transactions', status='running',
+                          created_at=now - timedelta(minutes=finance_app.JOB_TIMEOUT_MINUTES + 5)),
+            BackgroundJob(id=str(uuid.uuid4()), user_id=user_id, kind='import_transactions', status='queued',
+                          created_at=now - timedelta(hours=finance_app.JOB_RETENTION_HOURS + 1)),
+        ])
+        db.session.commit()
+        running_id, queued_id = [job.id for job in BackgroundJob.query.filter_by(user_id=user_id)
+                                 .order_by(BackgroundJob.created_at.desc())]
+    os.makedirs(os.path.join(finance_app.JOB_FOLDER, queued_id))
+
+    job = client.get(f'/api/jobs/{running_id}').get_json()
+    assert job['status'] == 'failed' and job['error']
+
+    with app.test_request_context():
+        finance_app.purge_old_jobs()
+    with app.app_context():
+        assert db.session.get(BackgroundJob, queued_id) is None
+        assert db.session.get(BackgroundJob, running_id) is not None
+    assert not os.path.exists(os.path.join(finance_app.JOB_FOLDER, queued_id))
+
+def test_account_removal_deletes_jobs():
+    finance_app.JOB_FOLDER = tempfile.mkdtemp()
+    for route in ('/reset_data', '/delete_account'):
+        client = login_client()
+        job = wait_for(client, client.get('/export_transactions?format=csv&background=1').get_json()['status_url'])
+        assert os.path.exists(os.path.join(finance_app.JOB_FOLDER, job['id']))
+
+        client.post(route, data={'password': 'x'})
+        with app.app_context():
+            assert db.session.get(BackgroundJob, job['id']) is None
+        assert not os.path.exists(os.path.join(finance_app.JOB_FOLDER, job['id']))
+
+if __name__ == "__main__":
+    test_export_job_runs_in_background()
+    test_failed_job_records_error()
+    test_stuck_jobs_expire_and_purge()
+    test_account_removal_deletes_jobs()
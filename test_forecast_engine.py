@@ -0,0 +1,33 @@
+from datetime import date, datetime
+from types import SimpleNamespace
+
+from forecast_engine import DAILY, forecast, recurring_dates
+
+def item(frequency, amount, type='Expense', day=1, month=None, created=datetime(2024, 1, 10)):
+    return SimpleNamespace(frequency=frequency, amount=amount, type=type, day_of_month=day,
+                           month_of_year=month, created_at=created)
+
+def test_recurring_dates_by_frequency():
+    start, end = date(2024, 1, 15), date(2024, 4, 30)
+    assert list(recurring_dates(item('Monthly', 1, day=31), start, end)) == \
+        [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)]
+    # Weekly series anchored on day 3 of the month it was added (Wed 3 Jan 2024)
+    weekly = list(recurring_dates(item('Weekly', 1, day=3), start, end))
+    assert weekly[0] == date(2024, 1, 17) and weekly[-1] == date(2024, 4, 24) and len(weekly) == 15
+    assert list(recurring_dates(item('Yearly', 1, day=29, month=2), date(2024, 1, 1), date(2026, 12, 31))) == \
+        [date(2024, 2, 29), date(2025, 2, 28), date(2026, 2, 28)]
+
+def test_forecast_running_balance():
+    recurring = [item('Monthly', 3000, 'Income', day=25), item('Weekly', 100, day=3), item('Yearly', 500, day=1, month=3)]
+    goals = [SimpleNamespace(target_date=date(2024, 2, 14), target_amount=1000)]
+    monthly = list(forecast(1000, recurring, goals, date(2024, 1, 15), months=2))
+    # Rest of Jan (+3000 - 3 weeks) lands in Feb's point; Feb: +3000 - 4 weeks - goal; Mar: +3000 - 4 weeks - yearly
+    assert monthly == [(date(2024, 2, 29), 5300), (date(2024, 3, 31), 7400)]
+
+    daily = list(forecast(1000, recurring, goals, date(2024, 1, 15), months=2, granularity=DAILY))
+    assert len(daily) == 76 and daily[0] == (date(2024, 1, 16), 1000)
+    assert dict(daily)[date(2024, 2, 14)] == 2500 and daily[-1] == monthly[-1]
+
+if __name__ == "__main__":
+    test_recurring_dates_by_frequency()
+    test_forecast_running_balance()
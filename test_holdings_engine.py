@@ -0,0 +1,57 @@
+import os
+import tempfile
+from datetime import date
+from types import SimpleNamespace
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'holdings.db')
+
+from holdings_engine import Ledger, compute_holdings
+
+def test_average_cost_replay():
+    key = (1, 'AAPL', 'Moomoo')
+    ledger = Ledger()
+    ledger.append(key, 'Buy', 10, 100.0, 5.0, date(2024, 1, 2), 1)
+    ledger.append(key, 'Buy', 10, 120.0, 5.0, date(2024, 2, 1), 2)
+    ledger.append(key, 'Dividend', 0, 12.5, 0.0, date(2024, 3, 1), 3)
+    ledger.append(key, 'Sell', 5, 150.0, 2.0, date(2024, 4, 1), 4)
+    ledger.append(key, 'Split', 15, 0.0, 0.0, date(2024, 5, 1), 5)
+
+    h = compute_holdings(ledger)[key]
+    # Average cost 2210 / 20 = 110.5; selling 5 removes 552.5
+    assert h['quantity'] == 30
+    assert abs(h['cost_basis'] - 1657.5) < 1e-9
+    assert abs(h['realized_pnl'] - (748.0 - 552.5)) < 1e-9
+    assert h['total_dividends'] == 12.5
+    assert h['first_buy_date'] == date(2024, 1, 2)
+    assert h['last_sell_date'] == date(2024, 4, 1)
+    assert h['last_trade_id'] == 5
+
+    # Continuing from a stored result matches a full replay
+    tail = Ledger()
+    tail.append(key, 'Sell', 10, 80.0, 1.0, date(2024, 6, 1), 6)
+    full = Ledger()
+    for i in range(len(ledger)):
+        full.append(key, ['Buy', 'Buy', 'Dividend', 'Sell', 'Split'][i], ledger.quantity[i],
+                    ledger.price[i], ledger.fees[i], date.fromordinal(ledger.date[i]), ledger.trade_id[i])
+    full.append(key, 'Sell', 10, 80.0, 1.0, date(2024, 6, 1), 6)
+    assert compute_holdings(tail, {key: h})[key] == compute_holdings(full)[key]
+
+def test_realized_pnl_per_brokerage():
+    from app import positions_by_symbol
+
+    ledger = Ledger()
+    ledger.append((1, 'AAPL', 'Moomoo'), 'Buy', 10, 100.0, 0.0, date(2024, 1, 2), 1)
+    ledger.append((1, 'AAPL', 'IBKR'), 'Buy', 10, 200.0, 0.0, date(2024, 1, 3), 2)
+    ledger.append((1, 'AAPL', 'Moomoo'), 'Sell', 5, 150.0, 0.0, date(2024, 2, 1), 3)
+    positions = [SimpleNamespace(symbol=key[1], market='US', currency='USD', **holding)
+                 for key, holding in compute_holdings(ledger).items()]
+
+    merged = positions_by_symbol(positions)['AAPL']
+    # The Moomoo sale is measured against Moomoo's 100 cost, not the blended 150
+    assert merged['realized_pnl'] == 250.0
+    assert merged['cost_basis'] == 2500.0 and merged['quantity'] == 15
+
+if __name__ == "__main__":
+    test_average_cost_replay()
+    test_realized_pnl_per_brokerage()
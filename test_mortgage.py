@@ -1,4 +1,10 @@
-from app import app, db, Mortgage, MortgageEvent, generate_mortgage_schedule
+import os
+import tempfile
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'mortgage.db')
+
+from app import app, db, Mortgage, MortgageEvent, MortgageCheckpoint, generate_mortgage_schedule, refresh_mortgage_ledger
 from datetime import date
 
 def test_schedule():
@@ -40,5 +46,164 @@ def test_schedule():
         r = schedule[120]
         print(f"Month {r['no']}: Bal={r['balance']:.2f}, MRTA={r['mrta_coverage']:.2f}, Net={r['net_exposure']:.2f}")
 
+def test_schedule_events_by_month():
+    from types import SimpleNamespace
+    from mortgage_engine import build_schedule, annuity_payment
+
+    m = SimpleNamespace(
+        start_date=date(2020, 1, 31), term_years=2, original_principal=100000.0,
+        has_mrta=False, mrta_original_amount=None, mrta_rate=None,
+        events=[
+            SimpleNamespace(date=date(2020, 1, 31), type='RATE_CHANGE', value=3.0),
+            SimpleNamespace(date=date(2020, 3, 5), type='PAYMENT', value=5000.0),
+            SimpleNamespace(date=date(2020, 3, 20), type='PAYMENT', value=1000.0),
+            SimpleNamespace(date=date(2020, 6, 1), type='RATE_CHANGE', value=6.0),
+        ]
+    )
+    schedule = build_schedule(m, today=date(2020, 5, 1))
+
+    # Month ends are clamped; a month's payments are totalled and split by daily accrual
+    assert [row['date'] for row in schedule[:3]] == [date(2020, 1, 31), date(2020, 2, 29), date(2020, 3, 31)]
+    interest_1 = 100000.0 * 0.03 * 34 / 365
+    balance_1 = 100000.0 - (5000.0 - interest_1)
+    interest_2 = balance_1 * 0.03 * 15 / 365
+    balance_2 = balance_1 - (1000.0 - interest_2)
+    march = schedule[2]
+    assert march['payment'] == 6000.0
+    assert abs(march['interest_paid'] - (interest_1 + interest_2)) < 1e-9
+    assert abs(march['balance'] - balance_2) < 1e-9
+    assert schedule[3]['type'] == 'History' and schedule[3]['balance'] == march['balance']
+
+    # Projected months pay the level amount for the rate in force until the rate moves
+    projected = [row for row in schedule if row['type'] == 'Projected']
+    assert projected[0]['no'] == 4
+    assert abs(projected[0]['payment'] - annuity_payment(balance_2, 0.03 / 12, 21)) < 1e-9
+    assert projected[1]['rate'] == 6.0 and projected[1]['payment'] > projected[0]['payment']
+    assert all(row['payment'] == projected[1]['payment'] for row in projected[1:])
+    assert schedule[-1]['no'] == 24 and abs(schedule[-1]['balance']) < 1e-6
+
+def test_accrual_checkpoints_resume():
+    from types import SimpleNamespace
+    from mortgage_engine import LoanState, ACCRUAL_MONTHLY, apply_events
+
+    events = [SimpleNamespace(date=date(2020, month, 15), type='PAYMENT', value=1500.0) for month in range(1, 13)]
+    events += [SimpleNamespace(date=date(2021, month, 15), type='PAYMENT', value=1500.0) for month in range(1, 13)]
+    full = LoanState(date(2019, 12, 15), 300000.0, 4.0)
+    splits, checkpoints = apply_events(full, events, ACCRUAL_MONTHLY, until=date(2022, 3, 1))
+
+    # 30/360: every month accrues exactly rate / 12
+    assert abs(splits[0][1] - 1000.0) < 1e-9
+    assert [c.date for c in checkpoints] == [date(2020, 1, 1), date(2021, 1, 1), date(2022, 1, 1)]
+
+    # Resuming from a checkpoint gives the same state as replaying from inception
+    resumed = checkpoints[1].copy()
+    apply_events(resumed, events[12:], ACCRUAL_MONTHLY, until=date(2022, 3, 1))
+    assert (resumed.balance, resumed.accrued) == (full.balance, full.accrued)
+
+def test_ledger_refresh_stores_checkpoints():
+    with app.app_context():
+        mortgage = Mortgage(name='Checkpoints', start_date=date(2015, 3, 1), original_principal=500000.0, term_years=30)
+        db.session.add(mortgage)
+        db.session.flush()
+        db.session.add(MortgageEvent(mortgage_id=mortgage.id, date=date(2015, 3, 1), type='RATE_CHANGE', value=4.0))
+        refresh_mortgage_ledger(mortgage, mortgage.start_date)
+        db.session.commit()
+        years = [c.date.year for c in MortgageCheckpoint.query.filter_by(mortgage_id=mortgage.id)]
+        assert years == list(range(2016, date.today().year + 1))
+
+        # A later event keeps the earlier checkpoints and re-derives the rest without duplicates
+        db.session.add(MortgageEvent(mortgage_id=mortgage.id, date=date(2020, 5, 5), type='PAYMENT', value=3000.0,
+                                     payment_kind='TOTAL'))
+        refresh_mortgage_ledger(mortgage, date(2020, 5, 5))
+        db.session.commit()
+        dates = [c.date for c in MortgageCheckpoint.query.filter_by(mortgage_id=mortgage.id)]
+        assert sorted(dates) == sorted(set(dates)) and len(dates) == len(years)
+
+def test_legacy_principal_payments():
+    from types import SimpleNamespace
+    from mortgage_engine import LoanState, PAYMENT_PRINCIPAL, PAYMENT_TOTAL, apply_events
+
+    events = [
+        SimpleNamespace(date=date(2024, 6, 1), type='PAYMENT', value=2400.0, balance_after=497600.0,
+                        payment_kind=PAYMENT_PRINCIPAL),
+        SimpleNamespace(date=date(2024, 7, 1), type='PAYMENT', value=2600.0, balance_after=None,
+                        payment_kind=PAYMENT_TOTAL),
+    ]
+    state = LoanState(date(2015, 3, 1), 500000.0, 4.0)
+    splits = apply_events(state, events)[0]
+
+    # The legacy entry stays principal-only at its recorded balance, and years of
+    # interest before it are not charged to the next instalment
+    assert splits[0][1:] == (0.0, 2400.0, 497600.0)
+    interest = 497600.0 * 0.04 * 30 / 365
+    assert abs(splits[1][1] - interest) < 1e-9
+    assert abs(state.balance - (497600.0 - (2600.0 - interest))) < 1e-9
+
+def test_simulate_scenarios():
+    from types import SimpleNamespace
+    from mortgage_engine import Scenario, build_schedule, simulate_scenarios
+
+    m = SimpleNamespace(
+        start_date=date(2020, 1, 1), term_years=25, original_principal=400000.0,
+        has_mrta=True, mrta_original_amount=400000.0, mrta_rate=4.0,
+        events=[SimpleNamespace(date=date(2020, 1, 1), type='RATE_CHANGE', value=4.0)]
+    )
+    schedule = build_schedule(m, today=date(2024, 12, 31))
+    projected = [row for row in schedule if row['type'] == 'Projected']
+    scenarios = [
+        Scenario({}),
+        Scenario({'extra_monthly': 300}),
+        Scenario({'lump_sums': [{'date': '2030-06-01', 'amount': 50000}]}),
+        Scenario({'rate_shocks': [{'date': '2026-01-01', 'delta': 2.0}]}),
+        Scenario({'refinance': {'date': '2030-01-01', 'rate': 3.0, 'term_years': 30}}),
+    ]
+    dates, (baseline, extra, lump, shock, refinance) = simulate_scenarios(m, schedule, scenarios)
+
+    # An empty scenario is the schedule's own projection
+    assert abs(baseline['total_interest'] - sum(row['interest_paid'] for row in projected)) < 1e-6
+    assert baseline['payoff_date'] == projected[-1]['date']
+    assert all(abs(a - row['net_exposure']) < 1e-6 for a, row in zip(baseline['net_exposure'], projected))
+
+    assert extra['payoff_date'] < baseline['payoff_date'] and extra['total_interest'] < baseline['total_interest']
+    assert lump['payoff_date'] < baseline['payoff_date']
+    assert shock['payoff_date'] == baseline['payoff_date'] and shock['total_interest'] > baseline['total_interest']
+    # Refinancing over 30 years from 2030 runs past the original term
+    assert refinance['payoff_date'] == date(2059, 12, 1) and dates[-1] == date(2059, 12, 1)
+    assert len(extra['net_exposure']) == len(dates)
+
+def test_scenario_rejects_bad_input():
+    from mortgage_engine import Scenario
+
+    for spec in [{'lump_sums': [5]}, {'lump_sums': {'date': '2030-01-01'}}, {'rate_shocks': 'up'},
+                 {'refinance': 1}, {'refinance': {'date': '2030-01-01', 'rate': 3, 'term_years': 1000000}},
+                 {'refinance': {'date': '2030-01-01', 'rate': 3, 'term_years': 'inf'}}, {'extra_monthly': 'nan'},
+                 {'extra_monthly': -5000}, {'lump_sums': [{'date': '2030-01-01', 'amount': -1}]},
+                 {'refinance': {'date': '2030-01-01', 'rate': -1, 'term_years': 20}}]:
+        try:
+            Scenario(spec)
+        except ValueError:
+            continue
+        raise AssertionError(f'{spec} was accepted')
+
+    # A rate cut deeper than the rate floors at 0%: no negative interest, the balance only falls
+    from types import SimpleNamespace
+    from mortgage_engine import build_schedule, simulate_scenarios
+    m = SimpleNamespace(
+        start_date=date(2020, 1, 1), term_years=25, original_principal=400000.0,
+        has_mrta=False, mrta_original_amount=None, mrta_rate=None,
+        events=[SimpleNamespace(date=date(2020, 1, 1), type='RATE_CHANGE', value=4.0)]
+    )
+    schedule = build_schedule(m, today=date(2024, 12, 31))
+    cut = simulate_scenarios(m, schedule, [Scenario({'rate_shocks': [{'date': '2030-01-01', 'delta': -10}]})])[1][0]
+    assert cut['total_interest'] > 0
+    before_cut = sum(row['interest_paid'] for row in schedule if row['type'] == 'Projected' and row['date'] < date(2030, 1, 1))
+    assert abs(cut['total_interest'] - before_cut) < 1e-6
+
 if __name__ == "__main__":
     test_schedule()
+    test_schedule_events_by_month()
+    test_accrual_checkpoints_resume()
+    test_ledger_refresh_stores_checkpoints()
+    test_legacy_principal_payments()
+    test_simulate_scenarios()
+    test_scenario_rejects_bad_input()